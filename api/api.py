@@ -1,6 +1,57 @@
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, Response, stream_with_context
+import json
 import time
-from core.esp32 import STATUS_CONNECTED, STATUS_DISCONNECTED, STATUS_WAITING
+from core.esp32 import STATUS_DISCONNECTED, STATUS_WAITING
+from api.compression import encoded_etag
+
+# Límite máximo para historiales transmitidos por streaming
+STREAM_MAX_LIMIT = 10000
+
+
+def _wants_ndjson():
+    """Indica si el cliente pidió NDJSON (?format=ndjson o Accept)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def _stream_rows(key, rows):
+    """Transmite filas de forma incremental sin materializar la lista
+    JSON: mismo formato que jsonify ({'success': true, key: [...]}).
+    NDJSON: un objeto por línea.
+    """
+    if _wants_ndjson():
+        def generate_ndjson():
+            for row in rows:
+                yield json.dumps(row) + '\n'
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+    def generate_json():
+        yield '{"success": true, "%s": [' % key
+        first = True
+        for row in rows:
+            yield ('' if first else ',') + json.dumps(row)
+            first = False
+        yield ']}'
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+
+def _parse_limit(default, maximum):
+    try:
+        limit = int(request.args.get('limit', default))
+        return max(1, min(limit, maximum))
+    except ValueError:
+        return default
+
+
+def _parse_epoch(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
 
 def register_routes(app, deps):
     config = deps['config']
@@ -9,13 +60,24 @@ def register_routes(app, deps):
     save_config = deps['save_config']
     save_session_record = deps['save_session_record']
     list_patient_records = deps['list_patient_records']
-    list_patient_sessions = deps['list_patient_sessions']
+    iter_patient_records = deps['iter_patient_records']
+    iter_patient_sessions = deps['iter_patient_sessions']
     create_patient = deps['create_patient']
     update_patient = deps['update_patient']
     delete_patient = deps['delete_patient']
+    search_patients = deps['search_patients']
     update_patient_summary = deps['update_patient_summary']
     compute_avg_bpm = deps['compute_avg_bpm']
-    accumulate_session_data = deps['accumulate_session_data']
+    ingest_readings = deps['ingest_readings']
+    save_ingest = deps['save_ingest']
+    get_db_stats = deps['get_db_stats']
+    maintenance_config = deps['maintenance_config']
+    maintenance_report = deps['maintenance_report']
+    start_maintenance = deps['start_maintenance']
+    compression_stats = deps['compression_stats']
+    udp_stats = deps['udp_stats']
+    startup_metrics = deps['startup_metrics']
+    get_ward_snapshot = deps['get_ward_snapshot']
 
     @app.route('/')
     def index():
@@ -23,23 +85,39 @@ def register_routes(app, deps):
 
     @app.route('/api/sensor_update', methods=['POST'])
     def sensor_update():
+        """Recibe una lectura suelta o un lote con secuencias
+        Lote: {'device_id', 'boot', 'now': millis(), 'oldest': seq más antigua en el buffer,
+               'readings': [{'seq', 't': millis() | 'ts': epoch, 'temperature', 'bpm', 'status'}]}
+        """
         try:
             data = request.get_json() or {}
-            
-            # Actualizar datos
-            if 'temperature' in data:
-                latest_data['temperature'] = float(data['temperature'])
-            if 'bpm' in data:
-                latest_data['bpm'] = int(data['bpm'])
-            
-            latest_data['status'] = data.get('status', STATUS_CONNECTED)
-            latest_data['last_update'] = time.time() # Marcar timestamp para evitar desconexion inmediata
-
-            # Acumular sesión si está activa
-            if session_state and session_state.get('active'):
-                 accumulate_session_data(latest_data, session_state)
-            
-            return jsonify({'success': True})
+            readings = data.get('readings')
+            if readings is None:
+                readings = [data]
+
+            device_id = data.get('device_id')
+            device_id = str(device_id) if device_id is not None else None
+            boot = data.get('boot')
+            # Lecturas y marca de agua se guardan juntas antes de confirmar el lote
+            result = ingest_readings(
+                readings, latest_data, session_state,
+                device_id=device_id,
+                boot=int(boot) if boot is not None else None,
+                sent_at_ms=data.get('now'),
+                oldest=data.get('oldest'),
+                persist=save_ingest
+            )
+
+            response = {'success': True}
+            if result['ack'] is not None:
+                response.update({
+                    'accepted': result['accepted'],
+                    'duplicates': result['duplicates'],
+                    'ack': result['ack']
+                })
+            return jsonify(response)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -55,6 +133,24 @@ def register_routes(app, deps):
             pass
         return jsonify(latest_data)
 
+    @app.route('/api/ward')
+    def ward_summary():
+        """Resumen de todos los dispositivos y sesiones (precalculado)"""
+        snapshot = get_ward_snapshot(config, session_state)
+        use_gzip = bool(request.accept_encodings['gzip'])
+        response = Response(
+            snapshot['body_gzip'] if use_gzip else snapshot['body'],
+            mimetype='application/json'
+        )
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(encoded_etag(snapshot['etag'], 'gzip' if use_gzip else None))
+        # Ya comprimida y con ETag: el after_request no la reprocesa
+        response.direct_passthrough = True
+        return response.make_conditional(request)
+
     @app.route('/api/alert/trigger')
     def trigger_alert():
         return jsonify({'success': True, 'message': 'Alerta activada'})
@@ -174,23 +270,14 @@ def register_routes(app, deps):
 
     @app.route('/api/patient/<int:pid>/sessions', methods=['GET'])
     def patient_sessions(pid):
-        try:
-            limit = int(request.args.get('limit', 50))
-            limit = max(1, min(limit, 200))
-        except ValueError:
-            limit = 50
-        records = list_patient_sessions(pid, limit)
-        return jsonify({'success': True, 'sessions': records})
+        limit = _parse_limit(50, STREAM_MAX_LIMIT)
+        rows = iter_patient_sessions(pid, limit, since=_parse_epoch('since'), until=_parse_epoch('until'))
+        return _stream_rows('sessions', rows)
 
     @app.route('/api/patient/history', methods=['GET'])
     def patient_history():
-        try:
-            limit = int(request.args.get('limit', 50))
-            limit = max(1, min(limit, 200))
-        except ValueError:
-            limit = 50
-        records = list_patient_records(limit)
-        return jsonify({'success': True, 'records': records})
+        limit = _parse_limit(50, STREAM_MAX_LIMIT)
+        return _stream_rows('records', iter_patient_records(limit))
 
     @app.route('/api/patient', methods=['POST'])
     def create_patient_endpoint():
@@ -244,6 +331,58 @@ def register_routes(app, deps):
         ]
         return jsonify({'success': True, 'patients': summary})
 
+    @app.route('/api/admin/maintenance', methods=['GET'])
+    def maintenance_status():
+        return jsonify({
+            'success': True,
+            'report': maintenance_report,
+            'policy': maintenance_config,
+            'db_stats': get_db_stats()
+        })
+
+    @app.route('/api/admin/maintenance', methods=['POST'])
+    def maintenance_run():
+        """Lanza el mantenimiento en segundo plano (consultar el estado con GET)"""
+        data = request.get_json(silent=True) or {}
+        convert = data.get('convert_auto_vacuum')
+        started = start_maintenance(
+            maintenance_config,
+            backup=bool(data.get('backup', True)),
+            convert=bool(convert) if convert is not None else None,
+            reindex=bool(data.get('rebuild_search_index', False))
+        )
+        if not started:
+            return jsonify({'success': False, 'error': 'Mantenimiento en curso'}), 409
+        return jsonify({'success': True, 'report': maintenance_report}), 202
+
+    @app.route('/api/admin/http_stats', methods=['GET'])
+    def http_stats():
+        stats = dict(compression_stats)
+        bytes_in = stats['bytes_in']
+        stats['ratio'] = round(stats['bytes_out'] / bytes_in, 3) if bytes_in else None
+        return jsonify({'success': True, 'stats': stats})
+
+    @app.route('/api/admin/ingest_stats', methods=['GET'])
+    def ingest_stats():
+        return jsonify({'success': True, 'udp': udp_stats})
+
+    @app.route('/api/admin/startup', methods=['GET'])
+    def startup_info():
+        return jsonify({'success': True, 'startup': startup_metrics})
+
+    @app.route('/api/patient/search', methods=['GET'])
+    def patient_search():
+        limit = _parse_limit(20, 200)
+        patients, next_cursor = search_patients(
+            request.args.get('q', ''), limit, request.args.get('cursor') or None
+        )
+        return jsonify({
+            'success': True,
+            'patients': patients,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+
     @app.route('/patients')
     def patients_page():
         return render_template('patients.html')
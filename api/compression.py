@@ -0,0 +1,193 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+
+from flask import request, url_for, abort, Response
+
+try:
+    import brotli  # Opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Configuración por defecto (se puede sobrescribir desde config/config.py)
+DEFAULT_COMPRESSION_CONFIG = {
+    'min_size': 1024,
+    'gzip_level': 6,
+    'brotli_quality': 5,
+    'static_max_age': 31536000,
+}
+
+COMPRESSIBLE_MIMETYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+)
+
+# Contadores para medir el efecto con el arnés de carga
+compression_stats = {
+    'responses': 0,
+    'compressed': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+    'not_modified': 0,
+    'by_encoding': {'br': 0, 'gzip': 0},
+}
+
+
+def _choose_encoding():
+    """Elige la mejor codificación aceptada por el cliente"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding, settings):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings['brotli_quality'])
+    return gzip.compress(data, compresslevel=settings['gzip_level'], mtime=0)
+
+
+class AssetManifest:
+    """Mapa de archivos estáticos a nombres con hash de contenido
+    El mapa se construye la primera vez que se usa (no al arrancar) y los
+    archivos se comprimen una sola vez por proceso, al pedirse por primera
+    vez; luego se sirven desde memoria con caché de larga duración.
+    """
+
+    def __init__(self, static_folder, settings):
+        self.static_folder = static_folder
+        self.settings = settings
+        self.hashed = {}    # 'js/app.js' -> 'js/app.1a2b3c4d5e.js'
+        self.files = {}     # 'js/app.1a2b3c4d5e.js' -> 'js/app.js'
+        self._cache = {}    # (nombre_con_hash, codificación) -> bytes
+        self._built = False
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def build(self):
+        self.hashed.clear()
+        self.files.clear()
+        self._cache.clear()
+        for root, _, names in os.walk(self.static_folder):
+            for name in names:
+                path = os.path.join(root, name)
+                logical = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:10]
+                base, ext = os.path.splitext(logical)
+                hashed = f"{base}.{digest}{ext}"
+                self.hashed[logical] = hashed
+                self.files[hashed] = logical
+        self._built = True
+
+    def url(self, filename):
+        """URL con hash del asset (o la ruta estática normal si no existe)"""
+        self._ensure_built()
+        hashed = self.hashed.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('hashed_asset', filename=hashed)
+
+    def body(self, hashed, encoding):
+        key = (hashed, encoding)
+        if key not in self._cache:
+            logical = self.files[hashed]
+            with open(os.path.join(self.static_folder, logical), 'rb') as f:
+                data = f.read()
+            self._cache[key] = _compress(data, encoding, self.settings) if encoding else data
+        return self._cache[key]
+
+
+def encoded_etag(etag, encoding):
+    """ETag fuerte por representación: distinto para gzip, br e identidad"""
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def init_compression(app, settings=None):
+    """Registra compresión negociada, assets con hash y cabeceras de caché
+    Args:
+        app (Flask): Aplicación
+        settings (dict): Ver DEFAULT_COMPRESSION_CONFIG
+    """
+    if settings is None:
+        settings = DEFAULT_COMPRESSION_CONFIG
+    settings = {**DEFAULT_COMPRESSION_CONFIG, **settings}
+
+    manifest = AssetManifest(app.static_folder, settings)
+    app.jinja_env.globals['asset_url'] = manifest.url
+
+    @app.route('/assets/<path:filename>')
+    def hashed_asset(filename):
+        manifest._ensure_built()
+        if filename not in manifest.files:
+            abort(404)
+        logical = manifest.files[filename]
+        mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+        encoding = _choose_encoding() if mimetype in COMPRESSIBLE_MIMETYPES else None
+        response = Response(manifest.body(filename, encoding), mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = f"public, max-age={settings['static_max_age']}, immutable"
+        response.set_etag(encoded_etag(filename, encoding))
+        # Ya está comprimida: el after_request no la vuelve a procesar
+        response.direct_passthrough = True
+        return response.make_conditional(request)
+
+    @app.after_request
+    def compress_response(response):
+        compression_stats['responses'] += 1
+        if response.status_code == 304:
+            compression_stats['not_modified'] += 1
+            return response
+
+        if response.direct_passthrough or response.is_streamed:
+            return response
+
+        # Elegir la codificación antes del ETag: cada representación lleva el suyo
+        encoding = None
+        if (response.status_code == 200
+                and response.mimetype in COMPRESSIBLE_MIMETYPES
+                and 'Content-Encoding' not in response.headers
+                and len(response.get_data()) >= settings['min_size']):
+            response.vary.add('Accept-Encoding')
+            encoding = _choose_encoding()
+
+        if request.method == 'GET' and request.path.startswith('/api/'):
+            # Los datos cambian: revalidar siempre, pero permitir 304 con ETag
+            response.headers.setdefault('Cache-Control', 'no-cache')
+            if response.status_code == 200 and not response.get_etag()[0]:
+                response.set_etag(encoded_etag(hashlib.sha1(response.get_data()).hexdigest(), encoding))
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    compression_stats['not_modified'] += 1
+                    return response
+
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        compressed = _compress(data, encoding, settings)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not etag.endswith(f"-{encoding}"):
+            # ETag puesto por la vista para el cuerpo sin comprimir
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        compression_stats['compressed'] += 1
+        compression_stats['bytes_in'] += len(data)
+        compression_stats['bytes_out'] += len(compressed)
+        compression_stats['by_encoding'][encoding] += 1
+        return response
+
+    return manifest
@@ -1,24 +1,11 @@
-from flask import Flask
-from flask_cors import CORS
+import time
+
+# Marca de inicio del proceso (para medir arranque en frío -> primera petición)
+_PROCESS_START = time.time()
+
 import threading
 import json
 import os
-from schema.schema import (
-    init_db,
-    list_patient_records,
-    create_patient,
-    update_patient,
-    delete_patient,
-    update_patient_summary,
-    save_session_record,
-    list_patient_sessions,
-)
-from core.esp32 import (
-    latest_data,
-    monitor_sensor_timeout,
-    accumulate_session_data,
-)
-from api.api import register_routes
 
 # Intentar importar configuración manual
 try:
@@ -28,6 +15,54 @@ try:
         CONFIG_FILE as CONFIG_FILE_NAME
     )
     CONFIG_FILE = CONFIG_FILE_NAME
+    try:
+        from config.config import SHOW_NETWORK_INFO
+    except ImportError:
+        SHOW_NETWORK_INFO = True
+    try:
+        from config.config import (
+            RETENTION_POLICY, MAINTENANCE_INTERVAL_S, MAINTENANCE_CHUNK_SIZE,
+            MAINTENANCE_VACUUM_PAGES, BACKUP_DIR, BACKUP_KEEP
+        )
+        try:
+            from config.config import MAINTENANCE_CONVERT_AUTO_VACUUM
+        except ImportError:
+            MAINTENANCE_CONVERT_AUTO_VACUUM = False
+        MAINTENANCE_CONFIG = {
+            'retention': RETENTION_POLICY,
+            'interval_s': MAINTENANCE_INTERVAL_S,
+            'chunk_size': MAINTENANCE_CHUNK_SIZE,
+            'vacuum_pages': MAINTENANCE_VACUUM_PAGES,
+            'backup_dir': BACKUP_DIR,
+            'backup_keep': BACKUP_KEEP,
+            'convert_auto_vacuum': MAINTENANCE_CONVERT_AUTO_VACUUM,
+        }
+    except ImportError:
+        MAINTENANCE_CONFIG = None
+    try:
+        from config.config import (
+            COMPRESS_MIN_SIZE, COMPRESS_GZIP_LEVEL, COMPRESS_BROTLI_QUALITY, STATIC_MAX_AGE
+        )
+        COMPRESSION_CONFIG = {
+            'min_size': COMPRESS_MIN_SIZE,
+            'gzip_level': COMPRESS_GZIP_LEVEL,
+            'brotli_quality': COMPRESS_BROTLI_QUALITY,
+            'static_max_age': STATIC_MAX_AGE,
+        }
+    except ImportError:
+        COMPRESSION_CONFIG = None
+    try:
+        from config.config import (
+            UDP_INGEST_ENABLED, UDP_INGEST_HOST, UDP_INGEST_PORT, UDP_QUEUE_SIZE
+        )
+        UDP_CONFIG = {
+            'enabled': UDP_INGEST_ENABLED,
+            'host': UDP_INGEST_HOST,
+            'port': UDP_INGEST_PORT,
+            'queue_size': UDP_QUEUE_SIZE,
+        }
+    except ImportError:
+        UDP_CONFIG = {}
     print("Configuración manual cargada desde config/config.py")
 except ImportError:
     # Valores por defecto si no existe config/config.py
@@ -39,12 +74,16 @@ except ImportError:
     BPM_MAX = 100
     FLASK_PORT = 5000
     FLASK_HOST = '0.0.0.0'
-    FLASK_DEBUG = True
+    FLASK_DEBUG = False
+    SHOW_NETWORK_INFO = True
     CONFIG_FILE = 'config.json'
+    MAINTENANCE_CONFIG = None
+    COMPRESSION_CONFIG = None
+    UDP_CONFIG = {}
     print("Usando configuración por defecto (crea config/config.py para personalizar)")
 
-app = Flask(__name__)
-CORS(app)
+# La variable de entorno FLASK_DEBUG tiene prioridad (producción: desactivado)
+FLASK_DEBUG = os.environ.get('FLASK_DEBUG', str(FLASK_DEBUG)).lower() in ('1', 'true', 'yes')
 
 # Base de datos manejada por schema.py
 
@@ -88,8 +127,21 @@ def save_config():
         print(f"Error guardando configuración: {e}")
 
 
+# Métricas de arranque (expuestas en /api/admin/startup)
+startup_metrics = {
+    'process_start': _PROCESS_START,
+    'app_created_s': None,
+    'deferred_init_s': None,
+    'first_request_s': None,
+}
+
+_init_lock = threading.Lock()
+_init_done = threading.Event()
 
-# Funciones de ESP32 manejadas por esp32.py
+# PID del proceso que ya inició los hilos de fondo (un worker WSGI tras fork
+# tiene otro PID y necesita los suyos)
+_services_lock = threading.Lock()
+_services_pid = None
 
 
 def _compute_avg_bpm():
@@ -98,21 +150,159 @@ def _compute_avg_bpm():
     return round(session_state['bpm_sum'] / session_state['bpm_count'], 1)
 
 
-register_routes(app, {
-    'config': config,
-    'session_state': session_state,
-    'latest_data': latest_data,
-    'save_config': save_config,
-    'save_session_record': save_session_record,
-    'list_patient_records': list_patient_records,
-    'list_patient_sessions': list_patient_sessions,
-    'create_patient': create_patient,
-    'update_patient': update_patient,
-    'delete_patient': delete_patient,
-    'update_patient_summary': update_patient_summary,
-    'compute_avg_bpm': _compute_avg_bpm,
-    'accumulate_session_data': accumulate_session_data,
-})
+def ensure_db_ready():
+    """Inicialización diferida de la base de datos (una sola vez por proceso)
+    Crea/migra tablas y restaura las marcas de agua de los dispositivos. Se
+    llama en segundo plano al arrancar y, si aún no terminó, en la primera
+    petición.
+    """
+    if _init_done.is_set():
+        return
+    with _init_lock:
+        if _init_done.is_set():
+            return
+        from schema.schema import init_db, list_device_states
+        from core.ingest import load_device_state
+
+        started = time.time()
+        init_db()
+        load_device_state(list_device_states())
+        startup_metrics['deferred_init_s'] = round(time.time() - started, 3)
+        _init_done.set()
+
+
+def create_app(start_services=True):
+    """Crea la aplicación Flask sin bloquear en la base de datos ni la red
+    Args:
+        start_services (bool): Iniciar también los hilos de fondo (monitor de
+            desconexión/alertas, mantenimiento y receptor UDP). Así
+            `gunicorn 'app:create_app()'` y `flask run` los tienen igual que
+            `python app.py`.
+    """
+    from flask import Flask
+    from flask_cors import CORS
+    from schema.schema import (
+        list_patient_records,
+        create_patient,
+        update_patient,
+        delete_patient,
+        search_patients,
+        update_patient_summary,
+        save_session_record,
+        iter_patient_records,
+        iter_patient_sessions,
+        save_ingest,
+        get_db_stats,
+    )
+    from schema.maintenance import DEFAULT_MAINTENANCE_CONFIG, maintenance_report, start_maintenance
+    from core.esp32 import latest_data
+    from core.ingest import ingest_readings
+    from core.udp_ingest import udp_stats
+    from core.ward import get_snapshot
+    from api.api import register_routes
+    from api.compression import compression_stats, init_compression
+
+    load_config()
+
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+    init_compression(flask_app, COMPRESSION_CONFIG)
+
+    @flask_app.before_request
+    def _first_request():
+        if startup_metrics['first_request_s'] is None:
+            ensure_db_ready()
+            startup_metrics['first_request_s'] = round(time.time() - _PROCESS_START, 3)
+            print(f"Primera petición a {startup_metrics['first_request_s']}s del arranque")
+
+    register_routes(flask_app, {
+        'config': config,
+        'session_state': session_state,
+        'latest_data': latest_data,
+        'save_config': save_config,
+        'save_session_record': save_session_record,
+        'list_patient_records': list_patient_records,
+        'iter_patient_records': iter_patient_records,
+        'iter_patient_sessions': iter_patient_sessions,
+        'create_patient': create_patient,
+        'update_patient': update_patient,
+        'delete_patient': delete_patient,
+        'search_patients': search_patients,
+        'update_patient_summary': update_patient_summary,
+        'compute_avg_bpm': _compute_avg_bpm,
+        'ingest_readings': ingest_readings,
+        'save_ingest': save_ingest,
+        'get_db_stats': get_db_stats,
+        'maintenance_config': MAINTENANCE_CONFIG or DEFAULT_MAINTENANCE_CONFIG,
+        'maintenance_report': maintenance_report,
+        'start_maintenance': start_maintenance,
+        'compression_stats': compression_stats,
+        'udp_stats': udp_stats,
+        'startup_metrics': startup_metrics,
+        'get_ward_snapshot': get_snapshot,
+    })
+
+    startup_metrics['app_created_s'] = round(time.time() - _PROCESS_START, 3)
+    if start_services:
+        start_background_services()
+    return flask_app
+
+
+def start_background_services():
+    """Inicia hilos de monitoreo, mantenimiento y (opcional) receptor UDP
+    Solo la primera llamada de cada proceso tiene efecto.
+    """
+    global _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+        _services_pid = os.getpid()
+
+    from core.esp32 import latest_data, monitor_sensor_timeout
+    from schema.maintenance import maintenance_loop
+
+    # Iniciar thread para monitorear timeouts
+    monitor_thread = threading.Thread(target=monitor_sensor_timeout, args=(config,), daemon=True)
+    monitor_thread.start()
+
+    # Iniciar thread de mantenimiento (retención, compactación, backups)
+    maintenance_thread = threading.Thread(target=maintenance_loop, args=(MAINTENANCE_CONFIG,), daemon=True)
+    maintenance_thread.start()
+
+    def _warm_up():
+        # Migraciones en segundo plano mientras el servidor empieza a escuchar
+        ensure_db_ready()
+        # Receptor UDP opcional (necesita las marcas de agua ya restauradas)
+        if UDP_CONFIG.get('enabled'):
+            from schema.schema import save_ingest
+            from core.udp_ingest import start_udp_listener
+            try:
+                start_udp_listener(latest_data, session_state, save_ingest, UDP_CONFIG)
+            except OSError as e:
+                # p. ej. puerto ya en uso por otro proceso (varios workers WSGI)
+                print(f"Receptor UDP no iniciado: {e}")
+
+    threading.Thread(target=_warm_up, daemon=True).start()
+
+
+_app = None
+
+
+def __getattr__(name):
+    """`app` se crea al primer acceso (compatible con `flask run` y WSGI `app:app`)
+    Los hilos de fondo se inician con la primera petición, así comandos como
+    `flask routes` no abren la base de datos ni el puerto UDP.
+    """
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app(start_services=False)
+            _app.before_request(start_background_services)
+        return _app
+    raise AttributeError(name)
+
 
 
 if __name__ == '__main__':
@@ -138,6 +328,8 @@ if __name__ == '__main__':
 
         # 2. Obtener SSID (Solo Windows)
         try:
+            if os.name != 'nt':
+                raise OSError('netsh solo existe en Windows')
             output = subprocess.check_output("netsh wlan show interfaces", shell=True).decode('utf-8', errors='ignore')
             for line in output.split('\n'):
                 if " SSID" in line and "BSSID" not in line:
@@ -156,18 +348,15 @@ if __name__ == '__main__':
         print(" Copia estos datos en tu archivo 'esp32_serial_flask.ino'")
         print("="*60 + "\n")
 
-    # Cargar configuración
-    load_config()
-    # Inicializar base de datos
-    init_db()
-    
+    def print_connection_info_async(port):
+        """Descubre la red en segundo plano para no retrasar el arranque"""
+        threading.Thread(target=print_connection_info, args=(port,), daemon=True).start()
+
+    app = create_app()
+
     # Mostrar info de red
-    print_connection_info(FLASK_PORT)
-    
-    # Iniciar thread para monitorear timeouts
-    monitor_thread = threading.Thread(target=monitor_sensor_timeout, args=(config,), daemon=True)
-    monitor_thread.start()
-    
+    if SHOW_NETWORK_INFO:
+        print_connection_info_async(FLASK_PORT)
+
     # Iniciar servidor Flask
     app.run(debug=FLASK_DEBUG, host=FLASK_HOST, port=FLASK_PORT, use_reloader=False)
-
@@ -37,10 +37,75 @@ FLASK_PORT = 5000
 # '127.0.0.1' = solo localhost
 FLASK_HOST = '0.0.0.0'
 
-# Modo debug de Flask (True/False)
-FLASK_DEBUG = True
+# Modo debug de Flask (True/False). En producción debe quedar desactivado;
+# la variable de entorno FLASK_DEBUG=1 lo activa sin editar este archivo
+FLASK_DEBUG = False
+
+# Mostrar IP/SSID al arrancar (se calcula en segundo plano, no retrasa el inicio)
+SHOW_NETWORK_INFO = True
 
 
 
 # Archivo donde se guarda la configuración persistente
 CONFIG_FILE = 'config.json'
+
+
+# ============================================
+# MANTENIMIENTO DE BASE DE DATOS
+# ============================================
+
+# Retención por tabla: días que se conservan los registros según su
+# columna de tiempo (epoch en segundos). None = conservar para siempre.
+RETENTION_POLICY = {
+    'sessions': {'ts_column': 'end_at', 'max_age_days': 730},
+    'samples': {'ts_column': 'sample_time', 'max_age_days': 30},
+}
+
+# Intervalo entre ejecuciones automáticas de mantenimiento (segundos)
+MAINTENANCE_INTERVAL_S = 6 * 3600
+
+# Filas borradas por transacción (evita bloqueos de escritura largos)
+MAINTENANCE_CHUNK_SIZE = 500
+
+# Páginas liberadas por cada PRAGMA incremental_vacuum
+MAINTENANCE_VACUUM_PAGES = 2000
+
+# Convertir una base creada antes de auto_vacuum=INCREMENTAL. Requiere un
+# VACUUM completo que bloquea la base mientras dura: activar solo en una
+# ventana sin tráfico (o usar POST /api/admin/maintenance con
+# {"convert_auto_vacuum": true}).
+MAINTENANCE_CONVERT_AUTO_VACUUM = False
+
+# Carpeta y cantidad de copias de seguridad a conservar
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+
+
+# ============================================
+# COMPRESIÓN Y CACHÉ HTTP
+# ============================================
+
+# Tamaño mínimo (bytes) para comprimir respuestas con gzip/brotli
+COMPRESS_MIN_SIZE = 1024
+
+# Nivel de compresión gzip (1-9) y calidad brotli (0-11)
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+
+# Cache-Control max-age (segundos) para assets estáticos con hash
+STATIC_MAX_AGE = 31536000
+
+
+# ============================================
+# RECEPTOR UDP (INGESTA LIGERA, OPCIONAL)
+# ============================================
+
+# Habilitar el receptor UDP además de /api/sensor_update
+UDP_INGEST_ENABLED = False
+
+# Dirección y puerto del receptor UDP
+UDP_INGEST_HOST = '0.0.0.0'
+UDP_INGEST_PORT = 5005
+
+# Datagramas en cola antes de descartar (ver /api/admin/ingest_stats)
+UDP_QUEUE_SIZE = 10000
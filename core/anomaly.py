@@ -0,0 +1,191 @@
+from bisect import insort, bisect_left
+from collections import deque
+
+# Configuración por defecto de la detección de anomalías
+DEFAULT_ANOMALY_CONFIG = {
+    'window': 11,             # Muestras en la ventana móvil (mediana/MAD)
+    'min_samples': 5,         # Muestras necesarias antes de marcar atípicos
+    'mad_threshold': 3.5,     # Límite del z-score modificado 0.6745 * |x - mediana| / MAD
+    'mad_floor': {'bpm': 2.0, 'temperature': 0.1},        # MAD mínimo (evita dividir por ~0)
+    'spike_threshold': {'bpm': 30, 'temperature': 1.5},   # Salto máximo respecto a la última muestra válida
+    'trend_alpha_fast': 0.3,  # Suavizado exponencial rápido
+    'trend_alpha_slow': 0.05, # Suavizado exponencial lento
+    'trend_threshold': {'bpm': 8, 'temperature': 0.3},    # Diferencia rápida-lenta para marcar tendencia
+}
+
+METRICS = ('bpm', 'temperature')
+
+# Estado por dispositivo y métrica:
+# (device_id, métrica) -> {'window': deque, 'sorted': list, 'last_valid', 'fast', 'slow', 'last_time'}
+detector_state = {}
+
+
+def _new_state(window):
+    return {
+        'window': deque(maxlen=window),
+        'sorted': [],
+        'last_valid': None,
+        'fast': None,
+        'slow': None,
+        'last_time': None,
+    }
+
+
+def _median(sorted_values):
+    n = len(sorted_values)
+    mid = n // 2
+    if n % 2:
+        return sorted_values[mid]
+    return (sorted_values[mid - 1] + sorted_values[mid]) / 2.0
+
+
+def _push(state, value):
+    """Agrega a la ventana manteniendo la copia ordenada (O(W) con W fijo)"""
+    window = state['window']
+    if len(window) == window.maxlen:
+        oldest = window[0]
+        del state['sorted'][bisect_left(state['sorted'], oldest)]
+    window.append(value)
+    insort(state['sorted'], value)
+
+
+def _check(state, metric, value, settings):
+    """Evalúa una muestra y devuelve sus marcas (sin modificar la ventana)"""
+    flags = []
+    ordered = state['sorted']
+
+    if len(ordered) >= settings['min_samples']:
+        med = _median(ordered)
+        deviation = 0.6745 * abs(value - med)
+        floor = settings['mad_floor'][metric]
+        # Con MAD >= floor, una desviación pequeña nunca supera el límite:
+        # se evita calcular el MAD en el caso común
+        if deviation / floor > settings['mad_threshold']:
+            mad = max(_median(sorted(abs(v - med) for v in ordered)), floor)
+            if deviation / mad > settings['mad_threshold']:
+                flags.append(f'{metric}_outlier')
+
+    # Salto: lejos de la muestra anterior y de la última válida (así el
+    # regreso tras un salto y un cambio de nivel sostenido no se marcan)
+    limit = settings['spike_threshold'][metric]
+    last_valid = state['last_valid']
+    if (last_valid is not None and state['window']
+            and abs(value - state['window'][-1]) > limit
+            and abs(value - last_valid) > limit):
+        flags.append(f'{metric}_spike')
+
+    return flags
+
+
+def _update_trend(state, metric, value, settings):
+    if state['fast'] is None:
+        state['fast'] = state['slow'] = float(value)
+        return None
+    state['fast'] += settings['trend_alpha_fast'] * (value - state['fast'])
+    state['slow'] += settings['trend_alpha_slow'] * (value - state['slow'])
+    diff = state['fast'] - state['slow']
+    if diff > settings['trend_threshold'][metric]:
+        return f'{metric}_trend_up'
+    if diff < -settings['trend_threshold'][metric]:
+        return f'{metric}_trend_down'
+    return None
+
+
+def analyze_sample(device_key, sample, sample_time=None, settings=None, states=None):
+    """Etapa de detección de anomalías por dispositivo (filtro de Hampel)
+    Marca atípicos por mediana/MAD móvil, saltos bruscos respecto a la
+    última muestra válida y tendencias (media exponencial rápida vs lenta).
+    Las muestras marcadas como atípicas o salto no alimentan la tendencia
+    ni el valor filtrado, pero sí la ventana (para adaptarse a cambios de
+    nivel reales). Una muestra anterior a la última analizada (reenvío
+    fuera de orden) se marca `late` y no modifica la ventana ni la tendencia.
+    Args:
+        device_key (str): Identificador del dispositivo
+        sample (dict): {'bpm', 'temperature'} (0 o ausente = sin lectura)
+        sample_time (float): Tiempo de la muestra (None = en orden de llegada)
+        settings (dict): Ver DEFAULT_ANOMALY_CONFIG
+        states (dict): Copia de trabajo de stage_device() (None = detector_state)
+    Returns:
+        tuple: (marcas, valores filtrados {'bpm', 'temperature'})
+    """
+    if settings is None:
+        settings = DEFAULT_ANOMALY_CONFIG
+
+    flags = []
+    filtered = {}
+    for metric in METRICS:
+        value = sample.get(metric)
+        if not value or value <= 0:
+            continue
+
+        if states is None:
+            table, key = detector_state, (device_key, metric)
+        else:
+            table, key = states, metric
+        state = table.get(key)
+        if state is None:
+            state = _new_state(settings['window'])
+            table[key] = state
+
+        if sample_time is not None:
+            if state['last_time'] is not None and sample_time < state['last_time']:
+                if 'late' not in flags:
+                    flags.append('late')
+                if state['sorted']:
+                    filtered[metric] = _median(state['sorted'])
+                continue
+            state['last_time'] = sample_time
+
+        metric_flags = _check(state, metric, value, settings)
+        _push(state, value)
+        if not metric_flags:
+            state['last_valid'] = value
+            trend = _update_trend(state, metric, value, settings)
+            if trend:
+                metric_flags.append(trend)
+        flags.extend(metric_flags)
+        filtered[metric] = _median(state['sorted'])
+
+    return flags, filtered
+
+
+def is_rejected(flags, metric):
+    """Indica si la métrica de la muestra se descartó como atípica o salto"""
+    return f'{metric}_outlier' in flags or f'{metric}_spike' in flags
+
+
+def _copy_state(state):
+    return {
+        **state,
+        'window': deque(state['window'], maxlen=state['window'].maxlen),
+        'sorted': list(state['sorted']),
+    }
+
+
+def stage_device(device_key, reset=False):
+    """Copia de trabajo del detector de un dispositivo
+    analyze_sample(..., states=copia) no modifica detector_state; los
+    cambios se publican con commit_device() solo si el lote se guardó.
+    Args:
+        reset (bool): Empezar sin historial (dispositivo reiniciado)
+    """
+    if reset:
+        return {}
+    return {
+        metric: _copy_state(detector_state[(device_key, metric)])
+        for metric in METRICS if (device_key, metric) in detector_state
+    }
+
+
+def commit_device(device_key, states, reset=False):
+    """Publica la copia de trabajo de stage_device()"""
+    if reset:
+        reset_device(device_key)
+    for metric, state in states.items():
+        detector_state[(device_key, metric)] = state
+
+
+def reset_device(device_key):
+    """Olvida el historial de un dispositivo (p. ej. al reiniciarse)"""
+    for metric in METRICS:
+        detector_state.pop((device_key, metric), None)
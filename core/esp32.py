@@ -18,9 +18,25 @@ latest_data = {
     'bpm': 0,
     'status': STATUS_WAITING,
     'alert': False,
-    'last_update': 0
+    'last_update': 0,
+    'sample_time': 0,
+    'device_id': None,
+    'flags': [],              # Marcas de anomalía de la última lectura
+    'bpm_filtered': None,     # Mediana móvil (sin atípicos) usada para alertas
+    'temperature_filtered': None
 }
 
+def evaluate_alert(temp, bpm, config=None):
+    """Indica si temperatura o BPM están fuera de los umbrales configurados"""
+    if config is None:
+        config = DEFAULT_ESP32_CONFIG
+    return (
+        temp > config.get('temp_max', DEFAULT_ESP32_CONFIG['temp_max']) or
+        temp < config.get('temp_min', DEFAULT_ESP32_CONFIG['temp_min']) or
+        bpm > config.get('bpm_max', DEFAULT_ESP32_CONFIG['bpm_max']) or
+        (bpm < config.get('bpm_min', DEFAULT_ESP32_CONFIG['bpm_min']) and bpm > 0)
+    )
+
 def monitor_sensor_timeout(config=None):
     """Loop en segundo plano para verificar desconexión por timeout"""
     global latest_data
@@ -38,19 +54,22 @@ def monitor_sensor_timeout(config=None):
                  latest_data['status'] = STATUS_DISCONNECTED
                  latest_data['bpm'] = 0
                  latest_data['temperature'] = 0.0
+                 latest_data['bpm_filtered'] = None
+                 latest_data['temperature_filtered'] = None
+                 latest_data['flags'] = []
 
         # Determinar si hay alerta según configuración (Revisar periódicamente)
-        temp = latest_data.get('temperature', 0)
-        bpm = latest_data.get('bpm', 0)
+        # Se usan los valores filtrados para no alertar por ruido del sensor
+        temp = latest_data.get('temperature_filtered')
+        if temp is None:
+            temp = latest_data.get('temperature', 0)
+        bpm = latest_data.get('bpm_filtered')
+        if bpm is None:
+            bpm = latest_data.get('bpm', 0)
         
         # Solo evaluar alertas si tenemos datos recientes
         if latest_data.get('status') not in [STATUS_DISCONNECTED, STATUS_WAITING]:
-            latest_data['alert'] = (
-                temp > config.get('temp_max', DEFAULT_ESP32_CONFIG['temp_max']) or
-                temp < config.get('temp_min', DEFAULT_ESP32_CONFIG['temp_min']) or
-                bpm > config.get('bpm_max', DEFAULT_ESP32_CONFIG['bpm_max']) or
-                (bpm < config.get('bpm_min', DEFAULT_ESP32_CONFIG['bpm_min']) and bpm > 0)
-            )
+            latest_data['alert'] = evaluate_alert(temp, bpm, config)
 
         time.sleep(1.0)
 
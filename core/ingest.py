@@ -0,0 +1,292 @@
+import time
+import threading
+
+from core.esp32 import STATUS_CONNECTED, accumulate_session_data
+from core.anomaly import analyze_sample, is_rejected, stage_device, commit_device
+from core.ward import update_device
+
+# Configuración por defecto del pipeline de ingesta
+DEFAULT_INGEST_CONFIG = {
+    'max_pending': 1024,  # Secuencias fuera de orden recordadas por dispositivo
+    'max_batch': 500,     # Lecturas aceptadas por petición
+}
+
+# Estado de deduplicación por dispositivo:
+# device_id -> {'boot': int, 'hwm': int, 'pending': set, 'last_seen': float}
+# `hwm` es la secuencia más alta recibida sin huecos; `pending` guarda las
+# recibidas por encima de `hwm` mientras falten anteriores.
+device_state = {}
+
+# Un lock por dispositivo cubre deduplicación, detector y escritura en base
+# de datos: una escritura lenta solo retrasa a su propio dispositivo. `_lock`
+# protege solo la publicación en latest_data/session_state (compartidos).
+_device_locks = {}
+_lock = threading.Lock()
+
+
+def _device_lock(key):
+    lock = _device_locks.get(key)
+    if lock is None:
+        with _lock:
+            lock = _device_locks.setdefault(key, threading.Lock())
+    return lock
+
+
+def load_device_state(rows):
+    """Restaura las marcas de agua guardadas en base de datos
+    Args:
+        rows (list): Diccionarios con device_id, boot, hwm, pending, last_seen
+    """
+    with _lock:
+        for r in rows:
+            device_state[r['device_id']] = {
+                'boot': r['boot'],
+                'hwm': r['hwm'],
+                'pending': set(r.get('pending') or []),
+                'last_seen': r.get('last_seen'),
+            }
+
+
+def _advance(state):
+    """Avanza la marca de agua mientras no haya huecos"""
+    while state['hwm'] + 1 in state['pending']:
+        state['hwm'] += 1
+        state['pending'].discard(state['hwm'])
+
+
+def _skip_lost(state, oldest):
+    """Da por perdidas las secuencias anteriores a `oldest`
+    El dispositivo indica la lectura más antigua que aún guarda: lo anterior
+    que falte se descartó de su buffer y no se reenviará nunca.
+    Returns:
+        bool: True si la marca de agua avanzó
+    """
+    if oldest - 1 <= state['hwm']:
+        return False
+    state['hwm'] = oldest - 1
+    state['pending'] = {seq for seq in state['pending'] if seq > state['hwm']}
+    _advance(state)
+    return True
+
+
+def _accept_seq(state, seq, max_pending):
+    """Registra `seq` y devuelve False si ya se había recibido"""
+    if seq <= state['hwm'] or seq in state['pending']:
+        return False
+
+    state['pending'].add(seq)
+    _advance(state)
+
+    # Limitar memoria: dar por perdidas las secuencias más antiguas del hueco
+    if len(state['pending']) > max_pending:
+        state['hwm'] = min(state['pending'])
+        state['pending'].discard(state['hwm'])
+        _advance(state)
+    return True
+
+
+def _ranges(seqs):
+    """Compacta secuencias en rangos [[inicio, fin], ...]"""
+    ranges = []
+    for seq in sorted(seqs):
+        if ranges and seq == ranges[-1][1] + 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return ranges
+
+
+def _device_ack(device_id, state):
+    """Acuse compacto para el dispositivo: marca de agua + rangos extra"""
+    return {
+        'device_id': device_id,
+        'boot': state['boot'],
+        'hwm': state['hwm'],
+        'ranges': _ranges(state['pending']),
+    }
+
+
+def _reading_time(reading, sent_at_ms, now):
+    """Calcula el tiempo real de la lectura
+    Acepta `ts` (epoch en segundos, si el dispositivo tiene reloj) o `t`
+    (millis() del dispositivo) junto con `sent_at_ms` (millis() al enviar).
+    """
+    ts = reading.get('ts')
+    if ts is not None:
+        ts = float(ts)
+        return ts if ts <= now else now
+    t = reading.get('t')
+    if t is not None and sent_at_ms is not None:
+        return now - max(0, int(sent_at_ms) - int(t)) / 1000.0
+    return now
+
+
+def _parse_reading(reading, sent_at_ms, now):
+    """Valida y convierte una lectura
+    Raises:
+        ValueError: Si la lectura está mal formada
+    """
+    try:
+        seq = reading.get('seq')
+        sample = {}
+        if 'temperature' in reading:
+            sample['temperature'] = float(reading['temperature'])
+        if 'bpm' in reading:
+            sample['bpm'] = int(reading['bpm'])
+        return {
+            'seq': int(seq) if seq is not None else None,
+            'sample_time': _reading_time(reading, sent_at_ms, now),
+            'sample': sample,
+            'status': reading.get('status', STATUS_CONNECTED),
+        }
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f'Lectura inválida: {e}') from e
+
+
+def ingest_readings(readings, latest_data, session_state, device_id=None, boot=None,
+                    sent_at_ms=None, oldest=None, persist=None, settings=None):
+    """Pipeline de ingesta común (HTTP, UDP, ...)
+    Deduplica por (device_id, boot, seq), marca anomalías por dispositivo,
+    actualiza latest_data solo con la lectura más reciente y acumula en la
+    sesión activa cada lectura nueva una única vez (sin valores atípicos).
+    El lote completo se valida antes de modificar nada: si una lectura está
+    mal formada o `persist` falla, no se marca ninguna secuencia como
+    recibida, el detector de anomalías queda como estaba y el dispositivo
+    puede reenviar el lote.
+    Args:
+        readings (list): Lecturas {'seq', 't'|'ts', 'temperature', 'bpm', 'status'}
+        latest_data (dict): Datos más recientes del sensor
+        session_state (dict): Estado de la sesión del paciente
+        device_id (str): Identificador del dispositivo (None = sin deduplicar)
+        boot (int): Identificador de arranque del dispositivo
+        sent_at_ms (int): millis() del dispositivo al enviar el lote
+        oldest (int): Secuencia más antigua que el dispositivo aún guarda
+        persist (callable): persist(samples, device) guarda el lote antes de
+            confirmarlo (None = lo guarda quien llama, p. ej. por lotes)
+        settings (dict): Ver DEFAULT_INGEST_CONFIG
+    Returns:
+        dict: {'accepted', 'duplicates', 'ack', 'changed', 'samples', 'device'}
+        `samples` son tuplas listas para save_ingest(); `device` es la foto
+        de la marca de agua a guardar (None si no cambió).
+    Raises:
+        ValueError: Si el lote está mal formado
+    """
+    if settings is None:
+        settings = DEFAULT_INGEST_CONFIG
+    if not isinstance(readings, list):
+        raise ValueError('`readings` debe ser una lista')
+    try:
+        sent_at_ms = int(sent_at_ms) if sent_at_ms is not None else None
+        oldest = int(oldest) if oldest is not None else None
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Lote inválido: {e}') from e
+
+    accepted = []
+    duplicates = 0
+    changed = False
+    samples = []
+
+    with _device_lock(device_id or 'default'):
+        now = time.time()
+        parsed = [_parse_reading(r, sent_at_ms, now) for r in readings[:settings['max_batch']]]
+
+        # Trabajar sobre una copia: solo se confirma si todo el lote se guarda
+        state = None
+        restarted = False
+        if device_id is not None:
+            current = device_state.get(device_id)
+            if current is None or (boot is not None and current['boot'] != boot):
+                # Dispositivo nuevo o reiniciado: la secuencia empieza de cero
+                state = {'boot': boot, 'hwm': -1, 'pending': set(), 'last_seen': now}
+                changed = True
+                # El historial del detector pertenece al arranque anterior
+                restarted = current is not None
+            else:
+                state = {**current, 'pending': set(current['pending']), 'last_seen': now}
+            if oldest is not None and _skip_lost(state, oldest):
+                changed = True
+
+        for reading in parsed:
+            seq = reading['seq']
+            if state is not None and seq is not None:
+                if not _accept_seq(state, seq, settings['max_pending']):
+                    duplicates += 1
+                    continue
+                changed = True
+            accepted.append(reading)
+
+        # El detector recibe las lecturas en orden de tiempo, no de llegada,
+        # sobre una copia de su estado (también se confirma tras guardar)
+        detector_key = device_id or 'default'
+        detector = stage_device(detector_key, reset=restarted)
+        accepted.sort(key=lambda r: r['sample_time'])
+        for reading in accepted:
+            reading['flags'], reading['filtered'] = analyze_sample(
+                detector_key, reading['sample'], reading['sample_time'], states=detector
+            )
+            samples.append((
+                device_id, reading['seq'], reading['sample_time'],
+                reading['sample'].get('temperature'), reading['sample'].get('bpm'),
+                reading['status'], ','.join(reading['flags']) or None
+            ))
+
+        device = None
+        if state is not None and changed:
+            device = {
+                'device_id': device_id,
+                'boot': state['boot'],
+                'hwm': state['hwm'],
+                'pending': sorted(state['pending']),
+                'last_seen': state['last_seen'],
+            }
+        if persist is not None:
+            persist(samples, [device] if device else [])
+
+        # A partir de aquí el lote queda confirmado
+        if state is not None:
+            device_state[device_id] = state
+        commit_device(detector_key, detector, reset=restarted)
+
+        # Resumen de sala por dispositivo
+        for reading in accepted:
+            update_device(device_id or 'default', reading['sample_time'], reading['sample'],
+                          reading['flags'], reading['filtered'], reading['status'], now)
+
+        with _lock:
+            for reading in accepted:
+                sample = reading['sample']
+                sample_time = reading['sample_time']
+                flags = reading['flags']
+                filtered = reading['filtered']
+
+                # Solo la lectura más reciente se publica en vivo
+                if sample_time >= latest_data.get('sample_time', 0):
+                    latest_data.update(sample)
+                    latest_data['status'] = reading['status']
+                    latest_data['sample_time'] = sample_time
+                    latest_data['flags'] = flags
+                    latest_data['bpm_filtered'] = filtered.get('bpm')
+                    latest_data['temperature_filtered'] = filtered.get('temperature')
+
+                # Acumular sesión si está activa (ignorando lecturas previas al inicio)
+                if session_state and session_state.get('active'):
+                    start_time = (session_state.get('patient') or {}).get('start_time', 0)
+                    if sample_time >= start_time:
+                        clean = {m: v for m, v in sample.items() if not is_rejected(flags, m)}
+                        accumulate_session_data(clean, session_state)
+
+            if accepted or duplicates:
+                latest_data['last_update'] = now  # Marcar timestamp para evitar desconexion inmediata
+                if state is not None:
+                    latest_data['device_id'] = device_id
+
+        ack = _device_ack(device_id, state) if state is not None else None
+
+    return {
+        'accepted': len(accepted),
+        'duplicates': duplicates,
+        'ack': ack,
+        'changed': changed,
+        'samples': samples,
+        'device': device,
+    }
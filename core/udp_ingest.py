@@ -0,0 +1,271 @@
+import json
+import time
+import queue
+import socket
+import struct
+import threading
+
+from core.ingest import ingest_readings
+
+# Configuración por defecto del receptor UDP (opcional, desactivado)
+DEFAULT_UDP_CONFIG = {
+    'enabled': False,
+    'host': '0.0.0.0',
+    'port': 5005,
+    'queue_size': 10000,       # Datagramas en espera; si se llena se descartan
+    'rcvbuf': 4 * 1024 * 1024,  # SO_RCVBUF solicitado al sistema
+    'flush_interval_s': 1.0,   # Espera máxima para guardar (y acusar) con tráfico continuo
+    'ack_delay_s': 0.05,       # Espera mínima entre guardados cuando la cola se vacía
+    'max_unflushed': 100000,   # Lecturas sin guardar antes de dejar de aceptar datagramas
+    'ack': True,               # Responder con el acuse al remitente
+}
+
+# Formato binario (little-endian):
+#   cabecera v1: b'VS' | 1 | boot u32 | now_ms u32 | n u16 | len(device_id) u8 | device_id
+#   cabecera v2: b'VS' | 2 | boot u32 | now_ms u32 | oldest u32 | n u16 | len(device_id) u8 | device_id
+#   lectura:     seq u32 | t_ms u32 | temperatura en centésimas i16 | bpm u16 | estado u8
+# `oldest` es la secuencia más antigua que el dispositivo aún guarda (ver
+# ingest_readings). También se acepta el mismo JSON que /api/sensor_update.
+MAGIC = b'VS'
+VERSION = 2
+HEADER_V1 = struct.Struct('<2sBIIHB')
+HEADER = struct.Struct('<2sBIIIHB')
+READING = struct.Struct('<IIhHB')
+ACK = struct.Struct('<2sIi')  # b'VA' | boot u32 | hwm i32
+
+STATUS_CODES = ('Normal', 'Sin lectura', 'BAJO', 'ALTO', 'TEMP!')
+
+# Contadores expuestos en /api/admin/ingest_stats
+udp_stats = {
+    'running': False,
+    'datagrams': 0,
+    'readings': 0,
+    'accepted': 0,
+    'duplicates': 0,
+    'malformed': 0,
+    'errors': 0,
+    'flush_errors': 0,
+    'deferred_unflushed': 0,
+    'dropped_queue_full': 0,
+    'acks_sent': 0,
+    'queue_depth': 0,
+}
+
+
+def encode_datagram(device_id, boot, now_ms, readings, oldest=None):
+    """Codifica lecturas en el formato binario (útil para simuladores y pruebas)"""
+    dev = device_id.encode('utf-8')
+    if oldest is None:
+        oldest = readings[0]['seq'] if readings else 0
+    parts = [HEADER.pack(MAGIC, VERSION, boot, now_ms & 0xFFFFFFFF, oldest, len(readings), len(dev)), dev]
+    for r in readings:
+        status = r.get('status', 'Normal')
+        parts.append(READING.pack(
+            r['seq'],
+            r['t'] & 0xFFFFFFFF,
+            int(round(r.get('temperature', 0) * 100)),
+            r.get('bpm', 0),
+            STATUS_CODES.index(status) if status in STATUS_CODES else 0
+        ))
+    return b''.join(parts)
+
+
+def decode_datagram(data):
+    """Decodifica un datagrama binario o JSON
+    Returns:
+        tuple: (device_id, boot, now_ms, oldest, lecturas)
+    Raises:
+        ValueError: Si el datagrama está mal formado
+    """
+    if data[:1] == b'{':
+        body = json.loads(data)
+        if not isinstance(body, dict):
+            raise ValueError('Se esperaba un objeto JSON')
+        readings = body.get('readings')
+        if readings is None:
+            readings = [body]
+        device_id = body.get('device_id')
+        boot = body.get('boot')
+        if boot is not None:
+            boot = int(boot)
+            if not 0 <= boot <= 0xFFFFFFFF:
+                raise ValueError('boot fuera de rango (u32)')
+        return (
+            str(device_id) if device_id is not None else None,
+            boot,
+            body.get('now'),
+            body.get('oldest'),
+            readings,
+        )
+
+    if len(data) < HEADER_V1.size or data[:2] != MAGIC:
+        raise ValueError('Cabecera desconocida')
+    if data[2] == 1:
+        header = HEADER_V1
+        magic, version, boot, now_ms, count, dev_len = header.unpack_from(data)
+        oldest = None
+    elif data[2] == 2 and len(data) >= HEADER.size:
+        header = HEADER
+        magic, version, boot, now_ms, oldest, count, dev_len = header.unpack_from(data)
+    else:
+        raise ValueError('Cabecera desconocida')
+    offset = header.size + dev_len
+    if len(data) != offset + count * READING.size:
+        raise ValueError('Longitud incorrecta')
+    device_id = data[header.size:offset].decode('utf-8')
+
+    readings = []
+    for seq, t, temp, bpm, status in READING.iter_unpack(data[offset:]):
+        readings.append({
+            'seq': seq,
+            't': t,
+            'temperature': temp / 100.0,
+            'bpm': bpm,
+            'status': STATUS_CODES[status] if status < len(STATUS_CODES) else STATUS_CODES[0],
+        })
+    return device_id, boot, now_ms, oldest, readings
+
+
+def _receive_loop(sock, pending, settings):
+    """Lee datagramas del socket lo más rápido posible y los encola"""
+    try:
+        while True:
+            try:
+                data, addr = sock.recvfrom(65535)
+            except OSError:
+                break
+            udp_stats['datagrams'] += 1
+            try:
+                pending.put_nowait((data, addr))
+            except queue.Full:
+                udp_stats['dropped_queue_full'] += 1
+    finally:
+        udp_stats['running'] = False
+
+
+def _handle_datagram(data, addr, latest_data, session_state, dirty, samples, acks):
+    """Pasa un datagrama al pipeline y deja su acuse pendiente de guardar"""
+    try:
+        device_id, boot, now_ms, oldest, readings = decode_datagram(data)
+        result = ingest_readings(
+            readings, latest_data, session_state,
+            device_id=device_id, boot=boot, sent_at_ms=now_ms, oldest=oldest
+        )
+    except (ValueError, TypeError, KeyError, AttributeError, UnicodeDecodeError, struct.error):
+        udp_stats['malformed'] += 1
+        return
+
+    udp_stats['readings'] += len(readings)
+    udp_stats['accepted'] += result['accepted']
+    udp_stats['duplicates'] += result['duplicates']
+    if result['device'] is not None:
+        dirty[device_id] = result['device']
+    samples.extend(result['samples'])
+    if result['ack'] is not None:
+        acks[(addr, device_id)] = result['ack']
+
+
+def _send_acks(sock, acks):
+    for (addr, _), ack in acks.items():
+        try:
+            sock.sendto(ACK.pack(b'VA', (ack['boot'] or 0) & 0xFFFFFFFF, ack['hwm']), addr)
+            udp_stats['acks_sent'] += 1
+        except (OSError, struct.error):
+            pass
+
+
+def _flush(sock, save_ingest, dirty, samples, acks, settings):
+    """Guarda lecturas y marcas de agua y solo entonces envía los acuses
+    Un acuse hace que el dispositivo borre esas lecturas de su buffer, así
+    que nunca se acusa algo que aún no está en la base de datos. Si falla se
+    conserva todo y se reintenta en el siguiente ciclo.
+    """
+    try:
+        save_ingest(samples, list(dirty.values()))
+    except Exception as e:
+        # p. ej. "database is locked" durante un backup
+        udp_stats['flush_errors'] += 1
+        print(f"Error guardando lecturas UDP (se reintentará): {e}")
+        return False
+    samples.clear()
+    dirty.clear()
+    if settings['ack']:
+        _send_acks(sock, acks)
+    acks.clear()
+    return True
+
+
+def _process_loop(sock, pending, latest_data, session_state, save_ingest, settings):
+    """Decodifica y pasa los datagramas al pipeline de ingesta común"""
+    dirty = {}  # device_id -> foto más reciente de su marca de agua
+    samples = []
+    acks = {}   # (dirección, device_id) -> último acuse, se envía tras guardar
+    last_flush = time.time()
+    failing = False
+    try:
+        while True:
+            timeout = settings['flush_interval_s']
+            if (samples or dirty or acks) and not failing:
+                timeout = max(0, last_flush + settings['ack_delay_s'] - time.time())
+            try:
+                data, addr = pending.get(timeout=timeout)
+            except queue.Empty:
+                data = None
+
+            if data is not None:
+                if len(samples) >= settings['max_unflushed']:
+                    # La base de datos no acepta escrituras: no aceptar (ni
+                    # acusar) más; el dispositivo las conserva y reenvía
+                    udp_stats['deferred_unflushed'] += 1
+                else:
+                    try:
+                        _handle_datagram(data, addr, latest_data, session_state, dirty, samples, acks)
+                    except Exception as e:
+                        # Un datagrama nunca debe detener el receptor
+                        udp_stats['errors'] += 1
+                        print(f"Error procesando datagrama UDP: {e}")
+
+            # Guardar por lotes: al vaciarse la cola (poca latencia del acuse)
+            # o cada flush_interval_s con tráfico continuo
+            now = time.time()
+            elapsed = now - last_flush
+            if (samples or dirty or acks) and (
+                    elapsed >= settings['flush_interval_s']
+                    or (pending.empty() and not failing and elapsed >= settings['ack_delay_s'])):
+                # Tras un fallo se reintenta cada flush_interval_s
+                failing = not _flush(sock, save_ingest, dirty, samples, acks, settings)
+                last_flush = now
+            udp_stats['queue_depth'] = pending.qsize()
+    finally:
+        udp_stats['running'] = False
+
+
+def start_udp_listener(latest_data, session_state, save_ingest, settings=None):
+    """Inicia el receptor UDP en hilos en segundo plano
+    Args:
+        latest_data (dict): Datos más recientes del sensor
+        session_state (dict): Estado de la sesión del paciente
+        save_ingest (callable): Persiste lecturas y marcas de agua en una transacción
+        settings (dict): Ver DEFAULT_UDP_CONFIG
+    Returns:
+        socket.socket: Socket enlazado (cerrarlo detiene el receptor)
+    """
+    settings = {**DEFAULT_UDP_CONFIG, **(settings or {})}
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, settings['rcvbuf'])
+    except OSError:
+        pass
+    sock.bind((settings['host'], settings['port']))
+
+    pending = queue.Queue(maxsize=settings['queue_size'])
+    threading.Thread(target=_receive_loop, args=(sock, pending, settings), daemon=True).start()
+    threading.Thread(
+        target=_process_loop,
+        args=(sock, pending, latest_data, session_state, save_ingest, settings),
+        daemon=True
+    ).start()
+    udp_stats['running'] = True
+    print(f"Receptor UDP escuchando en {settings['host']}:{sock.getsockname()[1]}")
+    return sock
@@ -0,0 +1,145 @@
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+from core.esp32 import evaluate_alert
+
+# Configuración por defecto del resumen de sala
+DEFAULT_WARD_CONFIG = {
+    'stale_after_s': 10.0,     # Sin lecturas durante este tiempo = dispositivo desactualizado
+    'refresh_interval_s': 1.0, # Antigüedad máxima del resumen precalculado
+}
+
+# Última lectura por dispositivo, mantenida en la ingesta (O(1) por lectura):
+# device_id -> {'sample_time', 'temperature', 'bpm', 'bpm_filtered',
+#               'temperature_filtered', 'flags', 'status', 'last_update'}
+ward_state = {}
+
+# Resumen precalculado que se sirve tal cual en /api/ward. Se reemplaza
+# completo en cada renovación (nunca se modifica), así una petición no mezcla
+# el cuerpo de un resumen con el ETag de otro.
+ward_snapshot = {
+    'generated_at': 0,
+    'body': b'',
+    'body_gzip': b'',
+    'etag': None,
+}
+
+_snapshot_lock = threading.Lock()
+
+
+def update_device(device_id, sample_time, sample, flags, filtered, status, now=None):
+    """Actualiza la entrada del dispositivo si la lectura es la más reciente"""
+    entry = ward_state.get(device_id)
+    if entry is not None and sample_time < entry['sample_time']:
+        return
+    previous = entry or {}
+    # Se publica una entrada completa nueva: build_snapshot (sin el lock de
+    # ingesta) nunca ve una a medio llenar
+    ward_state[device_id] = {
+        'sample_time': sample_time,
+        'temperature': sample.get('temperature', previous.get('temperature')),
+        'bpm': sample.get('bpm', previous.get('bpm')),
+        'bpm_filtered': filtered.get('bpm'),
+        'temperature_filtered': filtered.get('temperature'),
+        'flags': flags,
+        'status': status,
+        'last_update': now if now is not None else time.time(),
+    }
+
+
+def _session_summary(session_state):
+    if not session_state or not session_state.get('active') or not session_state.get('patient'):
+        return []
+    patient = session_state['patient']
+    count = session_state.get('bpm_count') or 0
+    return [{
+        'patient': patient.get('name'),
+        'identifier': patient.get('identifier'),
+        'patient_id': session_state.get('patient_db_id'),
+        'start_time': patient.get('start_time'),
+        'avg_bpm': round(session_state['bpm_sum'] / count, 1) if count else 0,
+        'min_bpm': session_state.get('min_bpm'),
+        'max_bpm': session_state.get('max_bpm'),
+        'last_temp': session_state.get('last_temp'),
+    }]
+
+
+def build_snapshot(config, session_state, settings=None, now=None):
+    """Recalcula el resumen de sala (O(dispositivos), a lo sumo una vez por intervalo)"""
+    if settings is None:
+        settings = DEFAULT_WARD_CONFIG
+    if now is None:
+        now = time.time()
+
+    devices = []
+    alerts = 0
+    for device_id, entry in list(ward_state.items()):
+        age = now - entry['last_update']
+        stale = age > settings['stale_after_s']
+        temp = entry['temperature_filtered'] if entry['temperature_filtered'] is not None else (entry['temperature'] or 0)
+        bpm = entry['bpm_filtered'] if entry['bpm_filtered'] is not None else (entry['bpm'] or 0)
+        alert = not stale and evaluate_alert(temp, bpm, config)
+        alerts += alert
+        devices.append({
+            'device_id': device_id,
+            'temperature': entry['temperature'],
+            'bpm': entry['bpm'],
+            'temperature_filtered': entry['temperature_filtered'],
+            'bpm_filtered': entry['bpm_filtered'],
+            'flags': entry['flags'],
+            'status': entry['status'],
+            'alert': alert,
+            'stale': stale,
+            'sample_time': entry['sample_time'],
+            'last_update': entry['last_update'],
+        })
+    devices.sort(key=lambda d: (not d['alert'], d['stale'], d['device_id']))
+
+    # Sin tiempos relativos (antigüedad, duración) ni la hora de generación:
+    # el cuerpo y su ETag solo cambian cuando cambian los datos, así los
+    # clientes que consultan periódicamente reciben 304. La antigüedad se
+    # calcula en el cliente a partir de `last_update`.
+    body = json.dumps({
+        'success': True,
+        'devices': devices,
+        'sessions': _session_summary(session_state),
+        'counts': {
+            'devices': len(devices),
+            'alerts': alerts,
+            'stale': sum(d['stale'] for d in devices),
+        },
+    }, separators=(',', ':')).encode('utf-8')
+
+    global ward_snapshot
+    etag = hashlib.sha1(body).hexdigest()
+    if etag == ward_snapshot['etag']:
+        # Sin cambios: reutilizar los bytes ya comprimidos
+        ward_snapshot = {**ward_snapshot, 'generated_at': now}
+    else:
+        ward_snapshot = {
+            'generated_at': now,
+            'body': body,
+            'body_gzip': gzip.compress(body, mtime=0),
+            'etag': etag,
+        }
+    return ward_snapshot
+
+
+def get_snapshot(config, session_state, settings=None):
+    """Devuelve el resumen precalculado, renovándolo si caducó
+    Todas las peticiones dentro de un intervalo comparten el mismo resumen,
+    así que el trabajo por petición no depende del número de clientes.
+    """
+    if settings is None:
+        settings = DEFAULT_WARD_CONFIG
+    now = time.time()
+    snapshot = ward_snapshot
+    if now - snapshot['generated_at'] >= settings['refresh_interval_s']:
+        with _snapshot_lock:
+            snapshot = ward_snapshot
+            if now - snapshot['generated_at'] >= settings['refresh_interval_s']:
+                snapshot = build_snapshot(config, session_state, settings, now)
+    return snapshot
@@ -11,6 +11,7 @@
 const char* ssid = "TU_WIFI_SSID";
 const char* password = "TU_WIFI_PASSWORD";
 String serverName = "http://192.168.1.X:5000/api/sensor_update"; // CAMBIAR POR LA IP DE TU PC
+String deviceId = "esp32-1"; // Identificador único del dispositivo
 
 // PINES ESP32
 #define pulsoPin 34      // Pin analógico para sensor de pulso
@@ -39,13 +40,108 @@ unsigned long lastUpdateTime = 0;
 WiFiClient client;
 HTTPClient http;
 
+// --- BUFFER DE LECTURAS (para reenviar si no hay WiFi o falla el POST) ---
+#define bufferSize 256       // Lecturas guardadas como máximo (se descartan las más antiguas)
+#define maxBatch 20          // Lecturas enviadas por POST
+#define retryInterval 5000   // Espera (ms) tras un fallo antes de reintentar
+
+struct Lectura {
+  uint32_t seq;
+  uint32_t t;      // millis() al tomar la lectura
+  float temp;
+  int bpm;
+  uint8_t estado;  // Índice en estados[]
+};
+
+const char* estados[] = {"Normal", "Sin lectura", "BAJO", "ALTO", "TEMP!"};
+
+Lectura buffer[bufferSize];
+int bufferStart = 0;    // Posición de la lectura más antigua sin confirmar
+int bufferCount = 0;
+uint32_t nextSeq = 0;
+uint32_t bootId = 0;    // Cambia en cada arranque: el servidor reinicia la secuencia
+unsigned long lastSendAttempt = 0;
+boolean lastSendFailed = false;
+
+void guardarLectura(float t, int bpm, uint8_t estado) {
+  if (bufferCount == bufferSize) {
+    // Buffer lleno: descartar la lectura más antigua
+    bufferStart = (bufferStart + 1) % bufferSize;
+    bufferCount--;
+  }
+  int pos = (bufferStart + bufferCount) % bufferSize;
+  buffer[pos].seq = nextSeq++;
+  buffer[pos].t = millis();
+  buffer[pos].temp = t;
+  buffer[pos].bpm = bpm;
+  buffer[pos].estado = estado;
+  bufferCount++;
+}
+
+// Descarta del buffer las lecturas confirmadas (seq <= hwm)
+void confirmarHasta(long hwm) {
+  while (bufferCount > 0 && (long)buffer[bufferStart].seq <= hwm) {
+    bufferStart = (bufferStart + 1) % bufferSize;
+    bufferCount--;
+  }
+}
+
+// Envía un lote con las lecturas pendientes más antiguas
+void enviarPendientes() {
+  if (bufferCount == 0 || WiFi.status() != WL_CONNECTED) {
+    return;
+  }
+  if (lastSendFailed && millis() - lastSendAttempt < retryInterval) {
+    return;
+  }
+  lastSendAttempt = millis();
+
+  int n = bufferCount < maxBatch ? bufferCount : maxBatch;
+  String jsonPayload = "{";
+  jsonPayload += "\"device_id\":\"" + deviceId + "\",";
+  jsonPayload += "\"boot\":" + String(bootId) + ",";
+  jsonPayload += "\"now\":" + String(millis()) + ",";
+  // Lo anterior a la lectura más antigua se descartó del buffer: el servidor no lo espera
+  jsonPayload += "\"oldest\":" + String(buffer[bufferStart].seq) + ",";
+  jsonPayload += "\"readings\":[";
+  for (int i = 0; i < n; i++) {
+    Lectura &l = buffer[(bufferStart + i) % bufferSize];
+    if (i > 0) jsonPayload += ",";
+    jsonPayload += "{\"seq\":" + String(l.seq);
+    jsonPayload += ",\"t\":" + String(l.t);
+    jsonPayload += ",\"temperature\":" + String(l.temp, 2);
+    jsonPayload += ",\"bpm\":" + String(l.bpm);
+    jsonPayload += ",\"status\":\"" + String(estados[l.estado]) + "\"}";
+  }
+  jsonPayload += "]}";
+
+  http.begin(client, serverName);
+  http.addHeader("Content-Type", "application/json"); // Especificar JSON
+  int code = http.POST(jsonPayload);
+  if (code == 200) {
+    // Respuesta: {..., "ack": {"hwm": N, ...}}
+    String respuesta = http.getString();
+    int pendientes = bufferCount;
+    int pos = respuesta.indexOf("\"hwm\":");
+    if (pos >= 0) {
+      confirmarHasta(respuesta.substring(pos + 6).toInt());
+    }
+    // Sin avance en el acuse: esperar retryInterval en vez de reenviar en bucle
+    lastSendFailed = (bufferCount == pendientes);
+  } else {
+    lastSendFailed = true;
+  }
+  http.end();
+}
+
 void setup() {
 
-  // Conectar WiFi
+  bootId = esp_random();
+
+  // Conectar WiFi (sin bloquear: las lecturas se guardan hasta que conecte)
+  WiFi.mode(WIFI_STA);
+  WiFi.setAutoReconnect(true);
   WiFi.begin(ssid, password);
-  while(WiFi.status() != WL_CONNECTED) {
-    delay(500);
-  }
 
   // Inicializar I2C para sensor de temperatura
   Wire.begin(sdaPin, sclPin);
@@ -84,23 +180,23 @@ void loop() {
     
     temp = sensor.readObjectTempC();
     
-    String estadoBPM = "Normal";
+    uint8_t estadoBPM = 0; // Normal
     boolean alerta = false;
     
     if (BPM == 0) {
-      estadoBPM = "Sin lectura";
+      estadoBPM = 1; // Sin lectura
     }
     else if (BPM < bpmBajo) {
-      estadoBPM = "BAJO";
+      estadoBPM = 2; // BAJO
       alerta = true;
     }
     else if (BPM > bpmNormal) {
-      estadoBPM = "ALTO";
+      estadoBPM = 3; // ALTO
       alerta = true;
     }
     
     if (temp < tempBaja || temp > tempAlta) {
-      estadoBPM = "TEMP!";
+      estadoBPM = 4; // TEMP!
       alerta = true;
     }
     
@@ -110,22 +206,11 @@ void loop() {
       digitalWrite(buzzerPin, LOW);
     }
     
-    // Enviar por HTTP
-    if(WiFi.status() == WL_CONNECTED){
-      http.begin(client, serverName);
-      http.addHeader("Content-Type", "application/json"); // Especificar JSON
-
-      // Crear JSON Manualmente
-      String jsonPayload = "{";
-      jsonPayload += "\"temperature\":" + String(temp, 2) + ",";
-      jsonPayload += "\"bpm\":" + String(BPM) + ",";
-      jsonPayload += "\"status\":\"" + estadoBPM + "\"";
-      jsonPayload += "}";
-
-      http.POST(jsonPayload);
-      http.end();
-    }
+    // Guardar en el buffer; se envía (o reenvía) por lotes
+    guardarLectura(temp, BPM, estadoBPM);
   }
+
+  enviarPendientes();
   
   delay(10);
 }
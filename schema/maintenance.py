@@ -0,0 +1,245 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+from schema.schema import DB_PATH, get_db_connection, get_db_stats, rebuild_patient_index
+
+# Políticas por defecto (se pueden sobrescribir desde config/config.py)
+DEFAULT_MAINTENANCE_CONFIG = {
+    'retention': {
+        'sessions': {'ts_column': 'end_at', 'max_age_days': 730},
+        'samples': {'ts_column': 'sample_time', 'max_age_days': 30},
+    },
+    'interval_s': 6 * 3600,
+    'chunk_size': 500,
+    'vacuum_pages': 2000,
+    'backup_dir': 'backups',
+    'backup_keep': 7,
+    'convert_auto_vacuum': False,  # VACUUM completo único para bases antiguas (bloquea todo el archivo)
+}
+
+# Resultado de la última ejecución (consultado desde /api/admin/maintenance)
+maintenance_report = {
+    'running': False,
+    'last_run': None,
+    'last_duration_s': None,
+    'pruned': {},
+    'freed_pages': 0,
+    'backup': None,
+    'reindexed': False,
+    'error': None,
+}
+
+# Evita ejecuciones simultáneas (hilo periódico y /api/admin/maintenance)
+_run_lock = threading.Lock()
+
+
+def prune_table(table, ts_column, max_age_days, chunk_size=500, pause_s=0.01):
+    """Borra por lotes los registros más antiguos que la retención indicada
+    Args:
+        table (str): Nombre de la tabla (debe tener columna id)
+        ts_column (str): Columna con el tiempo en segundos epoch
+        max_age_days (float): Días a conservar
+        chunk_size (int): Filas borradas por transacción
+        pause_s (float): Pausa entre lotes para ceder el bloqueo de escritura
+    Returns:
+        int: Total de filas borradas
+    """
+    cutoff = time.time() - max_age_days * 86400
+    deleted = 0
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE {ts_column} IS NOT NULL AND {ts_column} < ?
+                    LIMIT ?
+                )
+                """,
+                (cutoff, chunk_size)
+            )
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount < chunk_size:
+                break
+            time.sleep(pause_s)
+    finally:
+        conn.close()
+    return deleted
+
+
+def compact_db(vacuum_pages=2000, analyze=True, convert=False):
+    """Libera páginas vacías y actualiza estadísticas del planificador
+    Solo se liberan `vacuum_pages` por llamada. Las bases nuevas se crean con
+    auto_vacuum=INCREMENTAL (init_db); una base antigua solo se convierte si
+    `convert` es True, porque requiere un VACUUM completo que bloquea todo
+    el archivo mientras dura.
+    Returns:
+        int: Páginas libres recuperadas
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("PRAGMA auto_vacuum")
+        if cur.fetchone()[0] != 2 and convert:
+            cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cur.execute("VACUUM")
+
+        cur.execute("PRAGMA freelist_count")
+        free_before = cur.fetchone()[0]
+        cur.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+        cur.fetchall()
+        cur.execute("PRAGMA freelist_count")
+        free_after = cur.fetchone()[0]
+
+        if analyze:
+            cur.execute("ANALYZE")
+        cur.execute("PRAGMA optimize")
+        conn.commit()
+    finally:
+        conn.close()
+    return free_before - free_after
+
+
+def backup_db(backup_dir='backups', keep=7, pages=256):
+    """Copia de seguridad en línea mediante la API de backup de sqlite3
+    Copia por bloques de `pages` páginas para no bloquear a los escritores
+    y conserva solo las `keep` copias más recientes.
+    Returns:
+        str: Ruta de la copia creada
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(DB_PATH))[0]
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    dest_path = os.path.join(backup_dir, f"{base}-{stamp}.db")
+
+    src = get_db_connection()
+    dest = sqlite3.connect(dest_path)
+    try:
+        src.backup(dest, pages=pages, sleep=0.005)
+    finally:
+        dest.close()
+        src.close()
+
+    backups = sorted(
+        f for f in os.listdir(backup_dir)
+        if f.startswith(f"{base}-") and f.endswith('.db')
+    )
+    for old in backups[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(backup_dir, old))
+
+    return dest_path
+
+
+def _run(settings, backup, convert, reindex=False):
+    started = time.time()
+    pruned = {}
+    freed_pages = 0
+    backup_path = None
+    reindexed = False
+    error = None
+    try:
+        if reindex:
+            # Reconstrucción completa del índice de búsqueda (no se hace al
+            # arrancar: recorre toda la tabla patients)
+            rebuild_patient_index()
+            reindexed = True
+
+        retention = settings.get('retention', DEFAULT_MAINTENANCE_CONFIG['retention'])
+        chunk_size = settings.get('chunk_size', DEFAULT_MAINTENANCE_CONFIG['chunk_size'])
+        for table, policy in retention.items():
+            if policy.get('max_age_days') is None:
+                continue
+            pruned[table] = prune_table(
+                table, policy['ts_column'], policy['max_age_days'], chunk_size
+            )
+
+        if convert is None:
+            convert = settings.get('convert_auto_vacuum', False)
+        freed_pages = compact_db(
+            settings.get('vacuum_pages', DEFAULT_MAINTENANCE_CONFIG['vacuum_pages']),
+            analyze=any(pruned.values()),
+            convert=convert
+        )
+
+        if backup:
+            backup_path = backup_db(
+                settings.get('backup_dir', DEFAULT_MAINTENANCE_CONFIG['backup_dir']),
+                settings.get('backup_keep', DEFAULT_MAINTENANCE_CONFIG['backup_keep'])
+            )
+    except Exception as e:
+        error = str(e)
+        print(f"Error en mantenimiento de base de datos: {e}")
+
+    maintenance_report.update({
+        'running': False,
+        'last_run': started,
+        'last_duration_s': round(time.time() - started, 3),
+        'pruned': pruned,
+        'freed_pages': freed_pages,
+        'backup': backup_path,
+        'reindexed': reindexed,
+        'error': error,
+        'db_stats': get_db_stats(),
+    })
+    return dict(maintenance_report)
+
+
+def run_maintenance(settings=None, backup=True, convert=None, reindex=False):
+    """Ejecuta retención, compactación y copia de seguridad
+    Args:
+        settings (dict): Ver DEFAULT_MAINTENANCE_CONFIG
+        backup (bool): Si se debe crear copia de seguridad
+        convert (bool): Convertir a auto_vacuum=INCREMENTAL (None = según settings)
+        reindex (bool): Reconstruir el índice de búsqueda de pacientes
+    Returns:
+        dict: Reporte de la ejecución (también queda en maintenance_report)
+    """
+    if settings is None:
+        settings = DEFAULT_MAINTENANCE_CONFIG
+    if not _run_lock.acquire(blocking=False):
+        return dict(maintenance_report)
+    try:
+        maintenance_report['running'] = True
+        return _run(settings, backup, convert, reindex)
+    finally:
+        maintenance_report['running'] = False
+        _run_lock.release()
+
+
+def start_maintenance(settings=None, backup=True, convert=None, reindex=False):
+    """Lanza el mantenimiento en un hilo en segundo plano
+    Returns:
+        bool: False si ya había una ejecución en curso
+    """
+    if settings is None:
+        settings = DEFAULT_MAINTENANCE_CONFIG
+    if not _run_lock.acquire(blocking=False):
+        return False
+    maintenance_report['running'] = True
+
+    def _job():
+        try:
+            _run(settings, backup, convert, reindex)
+        finally:
+            maintenance_report['running'] = False
+            _run_lock.release()
+
+    threading.Thread(target=_job, daemon=True).start()
+    return True
+
+
+def maintenance_loop(settings=None):
+    """Loop en segundo plano que ejecuta el mantenimiento periódicamente"""
+    if settings is None:
+        settings = DEFAULT_MAINTENANCE_CONFIG
+
+    while True:
+        time.sleep(settings.get('interval_s', DEFAULT_MAINTENANCE_CONFIG['interval_s']))
+        run_maintenance(settings)
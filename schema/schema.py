@@ -1,4 +1,5 @@
 import sqlite3
+import json
 import os
 
 # Configuración de base de datos
@@ -32,17 +33,89 @@ CREATE TABLE IF NOT EXISTS sessions (
 )
 """
 
+# Marcas de agua de secuencia por dispositivo (deduplicación de reenvíos)
+DEVICES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_id TEXT PRIMARY KEY,
+    boot INTEGER,
+    hwm INTEGER NOT NULL DEFAULT -1,
+    pending TEXT,
+    last_seen REAL
+)
+"""
+
+# Lecturas individuales con sus marcas de anomalía
+SAMPLES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT,
+    seq INTEGER,
+    sample_time REAL,
+    temperature REAL,
+    bpm INTEGER,
+    status TEXT,
+    flags TEXT
+)
+"""
+
+SAMPLES_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_samples_time ON samples(sample_time)",
+    "CREATE INDEX IF NOT EXISTS idx_samples_device_time ON samples(device_id, sample_time)",
+)
+
+# Índice de texto completo sobre nombre e identificador (rowid = patients.id)
+PATIENTS_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+    name,
+    identifier,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
 def init_db():
     """Inicializa la base de datos SQLite con las tablas necesarias"""
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
 
+    # Compactación incremental (solo tiene efecto en una base nueva y vacía;
+    # las existentes se convierten desde schema/maintenance.py si se pide)
+    cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # Crear tabla de pacientes
     cur.execute(PATIENTS_SCHEMA)
 
     # Crear tabla de sesiones detalladas
     cur.execute(SESSIONS_SCHEMA)
 
+    # Crear tabla de dispositivos
+    cur.execute(DEVICES_SCHEMA)
+
+    # Crear tabla de lecturas
+    cur.execute(SAMPLES_SCHEMA)
+    for index_sql in SAMPLES_INDEXES:
+        cur.execute(index_sql)
+
+    # Crear índice de búsqueda (opcional: requiere SQLite con FTS5)
+    try:
+        cur.execute(PATIENTS_FTS_SCHEMA)
+        # Reconstruir si el índice quedó atrás (filas nuevas o borradas).
+        # Comprobación barata para no retrasar el arranque; la comparación
+        # completa es la reconstrucción explícita desde mantenimiento.
+        # patients_fts_docsize (tabla interna de FTS5) tiene una fila por
+        # documento y se cuenta mucho más rápido que patients_fts.
+        cur.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM patients), (SELECT MAX(id) FROM patients),
+                   (SELECT COUNT(*) FROM patients_fts_docsize), (SELECT MAX(id) FROM patients_fts_docsize)
+            """
+        )
+        count_patients, max_patient, count_indexed, max_indexed = cur.fetchone()
+        if count_patients != count_indexed or max_patient != max_indexed:
+            rebuild_patient_index(cur)
+    except sqlite3.OperationalError as e:
+        print(f"Búsqueda FTS5 no disponible, se usará LIKE: {e}")
+
     conn.commit()
     conn.close()
     print(f"Base de datos inicializada en {DB_PATH}")
@@ -53,6 +126,52 @@ def get_db_connection():
 
 # Funciones para tabla PATIENTS
 
+def rebuild_patient_index(cur=None):
+    """Reconstruye el índice FTS de pacientes desde la tabla patients
+    Sin cursor abre su propia conexión (p. ej. desde mantenimiento).
+    """
+    if cur is None:
+        conn = get_db_connection()
+        try:
+            rebuild_patient_index(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        return
+    cur.execute("DELETE FROM patients_fts")
+    cur.execute(
+        """
+        INSERT INTO patients_fts (rowid, name, identifier)
+        SELECT id, name, COALESCE(identifier, '') FROM patients
+        """
+    )
+
+def _sync_patient_index(cur, pid, name=None, identifier=None, delete=False):
+    """Mantiene patients_fts alineado con la fila `pid` de patients"""
+    try:
+        cur.execute("DELETE FROM patients_fts WHERE rowid = ?", (pid,))
+        if not delete:
+            cur.execute(
+                "INSERT INTO patients_fts (rowid, name, identifier) VALUES (?, ?, ?)",
+                (pid, name, identifier or '')
+            )
+    except sqlite3.OperationalError:
+        # SQLite sin FTS5: la búsqueda usa LIKE como respaldo
+        pass
+
+# Caracteres mínimos por término (los prefijos de 1 letra recorren casi todo
+# el índice) y candidatos más recientes que se ordenan por relevancia
+SEARCH_MIN_CHARS = 2
+SEARCH_MAX_CANDIDATES = 500
+
+def _search_terms(text):
+    """Términos de búsqueda con al menos SEARCH_MIN_CHARS caracteres"""
+    return [t for t in text.split() if len(t) >= SEARCH_MIN_CHARS]
+
+def _fts_query(terms):
+    """Convierte términos en una consulta FTS5 de prefijos (AND)"""
+    return ' '.join('"%s"*' % t.replace('"', '""') for t in terms)
+
 def save_patient_record(name, identifier, age, last_temp, avg_bpm):
     """Guarda el registro del paciente al cerrar sesión"""
     conn = get_db_connection()
@@ -64,38 +183,48 @@ def save_patient_record(name, identifier, age, last_temp, avg_bpm):
         """,
         (name, identifier, age, last_temp, avg_bpm)
     )
-    conn.commit()
     new_id = cur.lastrowid
+    _sync_patient_index(cur, new_id, name, identifier)
+    conn.commit()
     conn.close()
     return new_id
 
+PATIENT_COLUMNS = ('id', 'name', 'identifier', 'age', 'last_temp', 'avg_bpm', 'created_at')
+
+def iter_patient_records(limit=50, chunk_size=100):
+    """Recorre registros recientes de pacientes por lotes
+    Mantiene la memoria constante: solo hay `chunk_size` filas en memoria.
+    Cada lote es una consulta corta paginada por id (keyset), así no queda
+    una lectura abierta (ni su bloqueo SHARED) mientras el cliente descarga.
+    """
+    conn = get_db_connection()
+    try:
+        last_id = None
+        remaining = limit
+        while remaining > 0:
+            after = "" if last_id is None else "WHERE id < :last_id"
+            rows = conn.execute(
+                f"""
+                SELECT id, name, identifier, age, last_temp, avg_bpm, created_at
+                FROM patients
+                {after}
+                ORDER BY id DESC
+                LIMIT :limit
+                """,
+                {'last_id': last_id, 'limit': min(chunk_size, remaining)}
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            remaining -= len(rows)
+            for r in rows:
+                yield dict(zip(PATIENT_COLUMNS, r))
+    finally:
+        conn.close()
+
 def list_patient_records(limit=50):
     """Obtiene registros recientes de pacientes"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, name, identifier, age, last_temp, avg_bpm, created_at
-        FROM patients
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (limit,)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return [
-        {
-            'id': r[0],
-            'name': r[1],
-            'identifier': r[2],
-            'age': r[3],
-            'last_temp': r[4],
-            'avg_bpm': r[5],
-            'created_at': r[6],
-        }
-        for r in rows
-    ]
+    return list(iter_patient_records(limit))
 
 def create_patient(name, identifier=None, age=None):
     """Crea un nuevo paciente"""
@@ -108,8 +237,9 @@ def create_patient(name, identifier=None, age=None):
         """,
         (name, identifier, age)
     )
-    conn.commit()
     new_id = cur.lastrowid
+    _sync_patient_index(cur, new_id, name, identifier)
+    conn.commit()
     conn.close()
     return new_id
 
@@ -125,8 +255,10 @@ def update_patient(pid, name, identifier=None, age=None):
         """,
         (name, identifier, age, pid)
     )
-    conn.commit()
     changes = cur.rowcount
+    if changes > 0:
+        _sync_patient_index(cur, pid, name, identifier)
+    conn.commit()
     conn.close()
     return changes > 0
 
@@ -135,11 +267,109 @@ def delete_patient(pid):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("DELETE FROM patients WHERE id = ?", (pid,))
-    conn.commit()
     changes = cur.rowcount
+    if changes > 0:
+        _sync_patient_index(cur, pid, delete=True)
+    conn.commit()
     conn.close()
     return changes > 0
 
+def search_patients(text, limit=20, cursor=None):
+    """Busca pacientes por prefijo de nombre o identificador
+    Usa el índice FTS5: ordena por relevancia (bm25) solo los
+    SEARCH_MAX_CANDIDATES resultados más recientes, así el costo no crece con
+    el tamaño de la tabla. Si FTS5 no está disponible recurre a LIKE. Sin
+    texto devuelve los más recientes; con términos demasiado cortos, nada.
+    La paginación es por cursor (keyset), nunca con OFFSET.
+    Args:
+        text (str): Texto a buscar
+        limit (int): Resultados por página
+        cursor (str): `next_cursor` de la página anterior
+    Returns:
+        tuple: (lista de pacientes, next_cursor o None si no hay más)
+    """
+    text = (text or '').strip()
+    terms = _search_terms(text)
+    if text and not terms:
+        return [], None
+
+    last_rank = last_id = None
+    try:
+        if cursor:
+            if ':' in cursor:
+                rank, pid = cursor.split(':', 1)
+                last_rank, last_id = float(rank), int(pid)
+            else:
+                last_id = int(cursor)
+    except ValueError:
+        last_rank = last_id = None
+
+    params = {'limit': limit + 1, 'last_id': last_id, 'last_rank': last_rank}
+    conn = get_db_connection()
+    cur = conn.cursor()
+    ranked = False
+    try:
+        after_id = "" if last_id is None else "AND id < :last_id"
+        if not terms:
+            cur.execute(
+                f"""
+                SELECT id, name, identifier, age FROM patients
+                WHERE 1 {after_id}
+                ORDER BY id DESC LIMIT :limit
+                """,
+                params
+            )
+        else:
+            try:
+                params.update({'query': _fts_query(terms), 'max_candidates': SEARCH_MAX_CANDIDATES})
+                after_rank = "" if last_rank is None or last_id is None else (
+                    "AND (c.rank > :last_rank OR (c.rank = :last_rank AND c.rowid < :last_id))"
+                )
+                cur.execute(
+                    f"""
+                    WITH c AS (
+                        SELECT rowid, rank FROM patients_fts
+                        WHERE patients_fts MATCH :query
+                          AND rowid >= COALESCE((
+                              SELECT MIN(rowid) FROM (
+                                  SELECT rowid FROM patients_fts
+                                  WHERE patients_fts MATCH :query
+                                  ORDER BY rowid DESC LIMIT :max_candidates
+                              )
+                          ), 0)
+                    )
+                    SELECT p.id, p.name, p.identifier, p.age, c.rank
+                    FROM c JOIN patients p ON p.id = c.rowid
+                    WHERE 1 {after_rank}
+                    ORDER BY c.rank, c.rowid DESC
+                    LIMIT :limit
+                    """,
+                    params
+                )
+                ranked = True
+            except sqlite3.OperationalError:
+                params['like'] = f"%{text}%"
+                cur.execute(
+                    f"""
+                    SELECT id, name, identifier, age FROM patients
+                    WHERE (name LIKE :like OR identifier LIKE :like) {after_id}
+                    ORDER BY id DESC LIMIT :limit
+                    """,
+                    params
+                )
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last[4]!r}:{last[0]}" if ranked else str(last[0])
+    return [
+        {'id': r[0], 'name': r[1], 'identifier': r[2], 'age': r[3]}
+        for r in rows[:limit]
+    ], next_cursor
+
 def update_patient_summary(pid, last_temp, avg_bpm):
     """Actualiza resumen de métricas en tabla patients"""
     if not pid:
@@ -177,35 +407,51 @@ def save_session_record(patient_id, avg_bpm, min_bpm, max_bpm, last_temp, start_
     conn.close()
     return new_id
 
+SESSION_COLUMNS = ('id', 'avg_bpm', 'min_bpm', 'max_bpm', 'last_temp', 'start_at', 'end_at', 'created_at')
+
+def iter_patient_sessions(patient_id, limit=50, since=None, until=None, chunk_size=100):
+    """Recorre sesiones de un paciente por lotes paginados por id (keyset)
+    Ninguna lectura queda abierta entre lotes, así una descarga lenta no
+    bloquea las escrituras de la ingesta.
+    Args:
+        patient_id (int): ID del paciente
+        limit (int): Máximo de sesiones
+        since (float): Solo sesiones iniciadas desde este epoch (opcional)
+        until (float): Solo sesiones iniciadas antes de este epoch (opcional)
+        chunk_size (int): Filas leídas por consulta
+    """
+    conn = get_db_connection()
+    try:
+        last_id = None
+        remaining = limit
+        while remaining > 0:
+            after = "" if last_id is None else "AND id < :last_id"
+            rows = conn.execute(
+                f"""
+                SELECT id, avg_bpm, min_bpm, max_bpm, last_temp, start_at, end_at, created_at
+                FROM sessions
+                WHERE patient_id = :patient_id
+                  AND (:since IS NULL OR start_at >= :since)
+                  AND (:until IS NULL OR start_at < :until)
+                  {after}
+                ORDER BY id DESC
+                LIMIT :limit
+                """,
+                {'patient_id': patient_id, 'since': since, 'until': until,
+                 'last_id': last_id, 'limit': min(chunk_size, remaining)}
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            remaining -= len(rows)
+            for r in rows:
+                yield dict(zip(SESSION_COLUMNS, r))
+    finally:
+        conn.close()
+
 def list_patient_sessions(patient_id, limit=50):
     """Obtiene sesiones recientes de un paciente específico"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, avg_bpm, min_bpm, max_bpm, last_temp, start_at, end_at, created_at
-        FROM sessions
-        WHERE patient_id = ?
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (patient_id, limit)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return [
-        {
-            'id': r[0],
-            'avg_bpm': r[1],
-            'min_bpm': r[2],
-            'max_bpm': r[3],
-            'last_temp': r[4],
-            'start_at': r[5],
-            'end_at': r[6],
-            'created_at': r[7],
-        }
-        for r in rows
-    ]
+    return list(iter_patient_sessions(patient_id, limit))
 
 def get_session_by_id(session_id):
     """Obtiene una sesión específica por ID"""
@@ -235,6 +481,73 @@ def get_session_by_id(session_id):
         }
     return None
 
+# Funciones para tabla DEVICES
+
+def list_device_states():
+    """Obtiene las marcas de agua guardadas de todos los dispositivos"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT device_id, boot, hwm, pending, last_seen FROM devices")
+    rows = cur.fetchall()
+    conn.close()
+    return [
+        {
+            'device_id': r[0],
+            'boot': r[1],
+            'hwm': r[2],
+            'pending': json.loads(r[3]) if r[3] else [],
+            'last_seen': r[4],
+        }
+        for r in rows
+    ]
+
+# Funciones para tabla SAMPLES
+
+def save_ingest(rows, devices=()):
+    """Guarda un lote de lecturas y las marcas de agua en una sola transacción
+    Si falla, no queda guardada ninguna de las dos cosas.
+    Args:
+        rows (list): Tuplas (device_id, seq, sample_time, temperature, bpm, status, flags)
+        devices (list): Diccionarios con device_id, boot, hwm, pending, last_seen
+    Returns:
+        int: Lecturas guardadas
+    """
+    if not rows and not devices:
+        return 0
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        if rows:
+            cur.executemany(
+                """
+                INSERT INTO samples (device_id, seq, sample_time, temperature, bpm, status, flags)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+        # Una foto más antigua (otro hilo) no sobrescribe una más reciente
+        cur.executemany(
+            """
+            INSERT INTO devices (device_id, boot, hwm, pending, last_seen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(device_id) DO UPDATE SET
+                boot = excluded.boot,
+                hwm = excluded.hwm,
+                pending = excluded.pending,
+                last_seen = excluded.last_seen
+            WHERE devices.last_seen IS NULL OR excluded.last_seen >= devices.last_seen
+            """,
+            [
+                (d['device_id'], d['boot'], d['hwm'],
+                 json.dumps(d['pending']) if d['pending'] else None, d['last_seen'])
+                for d in devices
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
 # Funciones de utilidad
 
 def get_db_stats():
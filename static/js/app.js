@@ -11,6 +11,8 @@ const maxDataPoints = (typeof FRONTEND_CONFIG !== 'undefined' && FRONTEND_CONFIG
     : 50;
 
 let fetchTimer = null;
+let patientSearchController = null;
+const SEARCH_MIN_CHARS = 2;
 let errorStreak = 0;
 let baseInterval = 500;
 const maxBackoff = 4000;
@@ -787,14 +789,32 @@ async function loadSession() {
 async function loadPatientsBasic() {
     const select = document.getElementById('patientSelect');
     if (!select) return;
+    const searchInput = document.getElementById('patientSearch');
+    const query = searchInput ? searchInput.value.trim() : '';
+    if (query && query.length < SEARCH_MIN_CHARS) {
+        // Prefijos de una letra coinciden con casi todo: esperar a más texto
+        if (patientSearchController) patientSearchController.abort();
+        patientSearchController = null;
+        select.innerHTML = `<option value="">Escribe al menos ${SEARCH_MIN_CHARS} caracteres</option>`;
+        return;
+    }
     select.innerHTML = '<option value="">Cargando...</option>';
+    // Cancelar la búsqueda anterior: una respuesta lenta no debe pisar a una más nueva
+    if (patientSearchController) patientSearchController.abort();
+    const controller = new AbortController();
+    patientSearchController = controller;
     try {
-        const res = await fetch('/api/patient/list?limit=100');
+        const res = await fetch(`/api/patient/search?q=${encodeURIComponent(query)}&limit=50`, {
+            signal: controller.signal
+        });
         const data = await res.json();
+        if (controller !== patientSearchController) return;
         if (data.success) {
             state.patientList = data.patients || [];
             if (!state.patientList.length) {
-                select.innerHTML = '<option value="">Sin pacientes, crea uno en la gestión</option>';
+                select.innerHTML = query
+                    ? '<option value="">Sin coincidencias</option>'
+                    : '<option value="">Sin pacientes, crea uno en la gestión</option>';
                 return;
             }
             select.innerHTML = '<option value="">Selecciona un paciente...</option>';
@@ -808,8 +828,11 @@ async function loadPatientsBasic() {
             select.innerHTML = '<option value="">Error al cargar</option>';
         }
     } catch (e) {
+        if (controller !== patientSearchController) return;
         console.error('Error cargando pacientes', e);
         select.innerHTML = '<option value="">Error al cargar</option>';
+    } finally {
+        if (controller === patientSearchController) patientSearchController = null;
     }
 }
 
@@ -940,6 +963,14 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     if (useSelectedBtn) useSelectedBtn.addEventListener('click', startSessionFromSelect);
     if (refreshPatientsBtn) refreshPatientsBtn.addEventListener('click', loadPatientsBasic);
+    const patientSearch = document.getElementById('patientSearch');
+    if (patientSearch) {
+        let searchTimer = null;
+        patientSearch.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(loadPatientsBasic, 250);
+        });
+    }
     if (historyTable) {
         historyTable.addEventListener('click', (e) => {
             const btn = e.target.closest('button');
@@ -4,31 +4,124 @@ import random
 import urllib.request
 import urllib.error
 import sys
+import socket
+import struct
+from collections import deque
 
 # Configuración
 # Intenta conectarse a localhost por defecto
 SERVER_URL = "http://127.0.0.1:5000/api/sensor_update"
 
-def send_data(temp, bpm, status):
-    data = {
+# Con --udp se usa el receptor UDP binario (UDP_INGEST_ENABLED = True en config)
+USE_UDP = '--udp' in sys.argv
+UDP_ADDR = ("127.0.0.1", 5005)
+STATUS_CODES = ("Normal", "Sin lectura", "BAJO", "ALTO", "TEMP!")
+
+DEVICE_ID = "simulador-1"
+BOOT_ID = random.randint(1, 2**31 - 1)  # Cambia en cada ejecución (como un reinicio del ESP32)
+MAX_BUFFER = 256  # Lecturas guardadas sin confirmar (se descartan las más antiguas)
+MAX_BATCH = 20    # Lecturas por POST
+
+# Lecturas pendientes de confirmación por el servidor
+pending = deque(maxlen=MAX_BUFFER)
+next_seq = 0
+
+def millis():
+    return int(time.monotonic() * 1000)
+
+def buffer_reading(temp, bpm, status):
+    global next_seq
+    pending.append({
+        "seq": next_seq,
+        "t": millis(),
         "temperature": temp,
         "bpm": bpm,
         "status": status
-    }
-    
-    json_data = json.dumps(data).encode('utf-8')
-    req = urllib.request.Request(SERVER_URL, data=json_data, headers={'Content-Type': 'application/json'})
-    
-    try:
-        with urllib.request.urlopen(req) as response:
-            print(f"✅ Enviado: BPM={bpm} Temp={temp}°C ({status}) | Server: {response.getcode()}")
-    except urllib.error.URLError as e:
-        print(f"❌ Error conectando a {SERVER_URL}")
-        print(f"   Detalle: {e}")
-        print("   -> Asegúrate de que 'python app.py' esté corriendo en otra terminal.")
+    })
+    next_seq += 1
+
+def confirm(hwm, ranges=()):
+    """Descarta las lecturas confirmadas (seq <= hwm o dentro de `ranges`)
+    Returns:
+        int: Lecturas descartadas
+    """
+    before = len(pending)
+    while pending and pending[0]["seq"] <= hwm:
+        pending.popleft()
+    if ranges:
+        kept = [r for r in pending if not any(lo <= r["seq"] <= hi for lo, hi in ranges)]
+        pending.clear()
+        pending.extend(kept)
+    return before - len(pending)
+
+def send_pending_udp():
+    """Envía un lote en formato binario y espera el acuse (b'VA' | boot | hwm)"""
+    if not pending:
+        return
+    batch = list(pending)[:MAX_BATCH]
+    dev = DEVICE_ID.encode('utf-8')
+    payload = struct.pack('<2sBIIIHB', b'VS', 2, BOOT_ID, millis() & 0xFFFFFFFF, pending[0]["seq"],
+                          len(batch), len(dev)) + dev
+    for r in batch:
+        payload += struct.pack('<IIhHB', r["seq"], r["t"] & 0xFFFFFFFF, int(round(r["temperature"] * 100)),
+                               r["bpm"], STATUS_CODES.index(r["status"]))
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1.5)  # El acuse llega después de guardar en base de datos
+        sock.sendto(payload, UDP_ADDR)
+        try:
+            ack = sock.recv(64)
+        except (socket.timeout, OSError):
+            print(f"❌ Sin acuse UDP de {UDP_ADDR} ({len(pending)} lecturas en buffer)")
+            return
+
+    _, _, hwm = struct.unpack('<2sIi', ack[:10])
+    confirm(hwm)
+    last = batch[-1]
+    print(f"✅ Enviado (UDP): BPM={last['bpm']} Temp={last['temperature']}°C ({last['status']}) | "
+          f"lote={len(batch)} hwm={hwm}")
+
+def send_pending():
+    """Envía por lotes las lecturas pendientes y descarta las confirmadas"""
+    if USE_UDP:
+        send_pending_udp()
+        return
+    while pending:
+        batch = list(pending)[:MAX_BATCH]
+        data = {
+            "device_id": DEVICE_ID,
+            "boot": BOOT_ID,
+            "now": millis(),
+            "oldest": pending[0]["seq"],  # Lo anterior se descartó del buffer
+            "readings": batch
+        }
+
+        json_data = json.dumps(data).encode('utf-8')
+        req = urllib.request.Request(SERVER_URL, data=json_data, headers={'Content-Type': 'application/json'})
+
+        try:
+            with urllib.request.urlopen(req) as response:
+                body = json.loads(response.read().decode('utf-8'))
+        except urllib.error.URLError as e:
+            print(f"❌ Error conectando a {SERVER_URL} ({len(pending)} lecturas en buffer)")
+            print(f"   Detalle: {e}")
+            print("   -> Asegúrate de que 'python app.py' esté corriendo en otra terminal.")
+            return
+
+        ack = body.get('ack') or {}
+        hwm = ack.get('hwm', -1)
+        removed = confirm(hwm, ack.get('ranges') or [])
+
+        last = batch[-1]
+        print(f"✅ Enviado: BPM={last['bpm']} Temp={last['temperature']}°C ({last['status']}) | "
+              f"lote={len(batch)} nuevas={body.get('accepted')} duplicadas={body.get('duplicates')} hwm={hwm}")
+
+        if not removed or hwm < batch[-1]["seq"]:
+            # El servidor no confirmó todo el lote: reintentar en el próximo ciclo
+            return
 
 print("\n=== Simulador ESP32 (HTTP Client) ===")
-print(f"Destino: {SERVER_URL}")
+print(f"Destino: {UDP_ADDR if USE_UDP else SERVER_URL}")
 print("Generando signos vitales aleatorios...")
 print("Presiona CTRL+C para detener\n")
 
@@ -51,7 +144,8 @@ try:
             temp = round(random.uniform(38.0, 39.5), 1)
             status = "TEMP!"
 
-        send_data(temp, bpm, status)
+        buffer_reading(temp, bpm, status)
+        send_pending()
         time.sleep(2) # Simular intervalo del ESP32
 
 except KeyboardInterrupt: